@@ -3,49 +3,180 @@ API Routes for the LLM Deployment Service
 Contains all FastAPI route handlers
 """
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from typing import Dict, Any, List, Tuple
 import asyncio
+import functools
+import logging
+import orjson
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
 
-from models import ModelRequest, QueryRequest, QueryResponse, ModelStatus
-from model_manager import ModelManager
+from models import ModelRequest, QueryRequest, QueryResponse, BatchQueryRequest, BatchQueryResponse, ModelStatus
+from config import settings
 
 # Create router
 router = APIRouter()
 
-# Global model manager instance
-model_manager = ModelManager()
+logger = logging.getLogger(__name__)
 
-# Thread pool for model operations
-executor = ThreadPoolExecutor(max_workers=1)
+# Global model manager instance, created on first use so torch/transformers
+# are only imported once a model-touching route is hit
+_model_manager = None
+_model_manager_lock = threading.Lock()
 
 
-@router.post("/deploy", response_model=Dict[str, Any])
-async def deploy_model(model_request: ModelRequest, background_tasks: BackgroundTasks):
-    """Deploy a new model from Hugging Face."""
+def get_model_manager():
+    """Return the shared ModelManager, importing and creating it on first call."""
+    global _model_manager
+    if _model_manager is None:
+        # FastAPI runs sync dependencies in its threadpool, so first calls can overlap
+        with _model_manager_lock:
+            if _model_manager is None:
+                from model_manager import ModelManager, configure_cpu_threads
+                configure_cpu_threads(settings.TORCH_NUM_THREADS)
+                _model_manager = ModelManager()
+    return _model_manager
+
+# Separate pools so a /deploy load never queues behind /query generations.
+# They are thread pools in this process, so prompts and token tensors are handed
+# to the model by reference; nothing is pickled between the event loop and inference.
+load_executor = ThreadPoolExecutor(max_workers=settings.MAX_WORKERS)
+infer_executor = ThreadPoolExecutor(max_workers=settings.INFER_WORKERS)
+
+# Limits in-flight batches to the inference pool size so waiting queries keep batching
+_infer_slots = asyncio.Semaphore(settings.INFER_WORKERS)
+_batch_tasks = set()
+
+# Serialized /status body and ETag for the ModelManager state version they were built from
+_status_body: Tuple[int, bytes, str] = (-1, b"", "")
+
+# Distinguishes state versions across restarts so stale client ETags never match
+_boot_id = format(time.time_ns(), "x")
+
+# Pending (query, future) pairs waiting to be coalesced into a batch
+request_queue: asyncio.Queue = asyncio.Queue()
+
+# In-flight /query futures keyed by prompt and generation parameters
+_inflight: Dict[tuple, asyncio.Future] = {}
+
+
+def _generation_params(query_request: QueryRequest) -> Dict[str, Any]:
+    """Extract the generation parameters that must match for requests to share a batch."""
+    return {
+        "max_length": query_request.max_length,
+        "max_new_tokens": query_request.max_new_tokens,
+        "temperature": query_request.temperature,
+        "top_p": query_request.top_p,
+        "top_k": query_request.top_k,
+        "do_sample": query_request.do_sample,
+        "num_return_sequences": query_request.num_return_sequences,
+    }
+
+
+async def _run_batch(params: Dict[str, Any], items: List[Tuple[QueryRequest, asyncio.Future]]):
+    """Run one batched generate call and resolve the waiting futures."""
+    prompts = [query_request.prompt for query_request, _ in items]
+    loop = asyncio.get_running_loop()
+    
+    try:
+        results = await loop.run_in_executor(
+            infer_executor,
+            functools.partial(get_model_manager().generate_batch, prompts, **params)
+        )
+    except Exception as e:
+        for _, future in items:
+            if not future.done():
+                future.set_exception(e)
+        return
+    finally:
+        _infer_slots.release()
+    
+    for (_, future), result in zip(items, results):
+        if not future.done():
+            future.set_result(result)
+
+
+async def batch_worker():
+    """Coalesce queued queries into batched generate calls."""
+    loop = asyncio.get_running_loop()
     
-    if model_manager.is_loading:
+    while True:
+        batch = [await request_queue.get()]
+        
+        # Wait for a free inference worker; queries arriving meanwhile join this batch
+        await _infer_slots.acquire()
+        
+        # Keep collecting until the batch is full or the wait budget is spent
+        deadline = loop.time() + settings.MAX_WAIT_MS / 1000
+        while len(batch) < settings.MAX_BATCH:
+            if not request_queue.empty():
+                batch.append(request_queue.get_nowait())
+                continue
+            
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            
+            try:
+                batch.append(await asyncio.wait_for(request_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        # Only requests with identical generation parameters can share a generate call
+        groups: Dict[tuple, List[Tuple[QueryRequest, asyncio.Future]]] = {}
+        for query_request, future in batch:
+            params = _generation_params(query_request)
+            groups.setdefault(tuple(params.items()), []).append((query_request, future))
+        
+        for i, (key, items) in enumerate(groups.items()):
+            if i > 0:
+                await _infer_slots.acquire()
+            task = asyncio.create_task(_run_batch(dict(key), items))
+            _batch_tasks.add(task)
+            task.add_done_callback(_batch_tasks.discard)
+
+
+def _log_load_failure(future: asyncio.Future):
+    """Consume a finished load's exception; the error is reported through /status."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Background model load failed: {future.exception()}")
+
+
+@router.post("/deploy", response_model=Dict[str, Any], status_code=202)
+async def deploy_model(model_request: ModelRequest, model_manager=Depends(get_model_manager)):
+    """Deploy a new model from Hugging Face; loading continues after the response is sent."""
+    
+    # Read the state once; checking and claiming it with no await in between is atomic on the event loop
+    state = model_manager.state
+    if state == "loading":
         raise HTTPException(status_code=400, detail="Model is currently loading. Please wait.")
     
-    if model_manager.model is not None or model_manager.generator is not None:
+    if state != "empty":
         raise HTTPException(status_code=400, detail="Model is already loaded. Use /undeploy to unload first.")
     
     device = model_manager.get_device(model_request.device)
-    model_manager.set_model_name(model_request.model_name)
+    # Marks the manager as loading before any await, so a concurrent /deploy sees it
+    model_manager.begin_loading(model_request.model_name)
     
-    # Start loading in background (CPU-only, quantization disabled)
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(
-        executor,
+    # Start loading in background (CPU-only, optional INT8/INT4 weights); poll /status or /events for progress
+    loop = asyncio.get_running_loop()
+    load_future = loop.run_in_executor(
+        load_executor,
         model_manager.load_model_sync,
         model_request.model_name,
         device,
-        False,  # load_in_8bit disabled for CPU
-        False,  # load_in_4bit disabled for CPU
+        model_request.load_in_8bit,
+        model_request.load_in_4bit,
         model_request.trust_remote_code,
-        model_request.hf_token
+        model_request.hf_token,
+        model_request.load_in_8bit_cpu,
+        model_request.backend
     )
+    load_future.add_done_callback(_log_load_failure)
     
     return {
         "message": f"Model {model_request.model_name} is being loaded on {device}",
@@ -58,34 +189,161 @@ async def deploy_model(model_request: ModelRequest, background_tasks: Background
 @router.post("/query", response_model=QueryResponse)
 async def query_model(query_request: QueryRequest):
     """Query the deployed model."""
+    params = _generation_params(query_request)
+    key = (query_request.prompt, *params.values())
+    
+    # Identical concurrent queries share one generation, unless they ask for several samples
+    share = not (query_request.do_sample and query_request.num_return_sequences > 1)
+    future = _inflight.get(key) if share else None
+    
+    if future is None:
+        future = asyncio.get_running_loop().create_future()
+        await request_queue.put((query_request, future))
+        if share:
+            _inflight[key] = future
+            future.add_done_callback(lambda _: _inflight.pop(key, None))
+    
     try:
-        result = model_manager.generate_response(
-            prompt=query_request.prompt,
-            max_length=query_request.max_length,
-            max_new_tokens=query_request.max_new_tokens,
-            temperature=query_request.temperature,
-            top_p=query_request.top_p,
-            top_k=query_request.top_k,
-            do_sample=query_request.do_sample,
-            num_return_sequences=query_request.num_return_sequences
-        )
+        # Shield so one caller disconnecting doesn't cancel the result for the others
+        result = await asyncio.shield(future)
+        # Results are built internally by ModelManager, so validation can be skipped
+        return QueryResponse.model_construct(**result)
         
-        return QueryResponse(**result)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/query_batch", response_model=BatchQueryResponse)
+async def query_model_batch(batch_request: BatchQueryRequest):
+    """Query the deployed model with several prompts, generated together in padded batches."""
+    params = batch_request.model_dump(exclude={"prompts"})
+    loop = asyncio.get_running_loop()
+    
+    # Enqueue every prompt before awaiting, so the batch worker picks them up as one batch
+    # (split into MAX_BATCH-sized generate calls) instead of one forward pass per prompt
+    futures = []
+    for prompt in batch_request.prompts:
+        future = loop.create_future()
+        await request_queue.put((QueryRequest(prompt=prompt, **params), future))
+        futures.append(future)
+    
+    try:
+        results = await asyncio.gather(*futures)
+        return BatchQueryResponse.model_construct(
+            responses=[QueryResponse.model_construct(**result) for result in results]
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/query/stream")
+async def query_model_stream(query_request: QueryRequest, model_manager=Depends(get_model_manager)):
+    """Query the deployed model, streaming text chunks as server-sent events."""
+    if model_manager.state != "ready":
+        raise HTTPException(status_code=500, detail="No model is currently loaded. Please deploy a model first.")
+    
+    async def event_generator():
+        loop = asyncio.get_running_loop()
+        stop_event = threading.Event()
+        
+        # Streams share the inference pool and its slots with batched /query generations
+        await _infer_slots.acquire()
+        try:
+            chunks, generation = model_manager.stream_response(
+                prompt=query_request.prompt,
+                max_length=query_request.max_length,
+                max_new_tokens=query_request.max_new_tokens,
+                temperature=query_request.temperature,
+                top_p=query_request.top_p,
+                top_k=query_request.top_k,
+                do_sample=query_request.do_sample,
+                executor=infer_executor,
+                stop_event=stop_event
+            )
+        except Exception as e:
+            _infer_slots.release()
+            yield b"event: error\ndata: " + orjson.dumps({"detail": str(e)}) + b"\n\n"
+            return
+        
+        # The slot is freed when generate() returns, not when the client stops reading
+        generation.add_done_callback(lambda _: loop.call_soon_threadsafe(_infer_slots.release))
+        
+        try:
+            # Each blocking wait for the next chunk runs in a worker thread, keeping the event loop free
+            async for text in iterate_in_threadpool(chunks):
+                yield b"data: " + orjson.dumps({"text": text}) + b"\n\n"
+            yield b"data: [DONE]\n\n"
+        except Exception as e:
+            yield b"event: error\ndata: " + orjson.dumps({"detail": str(e)}) + b"\n\n"
+        finally:
+            # Runs on completion and when a disconnected client's stream is closed
+            stop_event.set()
+    
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
 @router.get("/status", response_model=ModelStatus)
-async def get_model_status():
+async def get_model_status(request: Request, model_manager=Depends(get_model_manager)):
     """Get the current status of the model."""
-    status = model_manager.get_status()
-    return ModelStatus(**status)
+    global _status_body
+    
+    # Re-serialize only when the model state has changed since the last poll
+    status, version = model_manager.get_status_with_version()
+    if _status_body[0] != version:
+        _status_body = (version, orjson.dumps(status), f'W/"{_boot_id}-{version}"')
+    
+    _, body, etag = _status_body
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+def _status_event(status: Dict[str, Any]) -> str:
+    """Name the state a status dict describes for /events subscribers."""
+    if status["is_loading"]:
+        return "loading"
+    if status["is_loaded"]:
+        return "loaded"
+    if status.get("load_error"):
+        return "failed"
+    return "unloaded"
+
+
+@router.websocket("/events")
+async def model_events(websocket: WebSocket, model_manager=Depends(get_model_manager)):
+    """Push model status to the client whenever the ModelManager state changes."""
+    await websocket.accept()
+    
+    loop = asyncio.get_running_loop()
+    updates: asyncio.Queue = asyncio.Queue()
+    
+    def on_state_change(status: Dict[str, Any], version: int):
+        # Transitions happen on executor threads; hop back onto the event loop
+        try:
+            loop.call_soon_threadsafe(updates.put_nowait, status)
+        except RuntimeError:
+            pass
+    
+    model_manager.add_state_listener(on_state_change)
+    try:
+        status = model_manager.get_status()
+        while True:
+            await websocket.send_text(orjson.dumps({"event": _status_event(status), "status": status}).decode())
+            status = await updates.get()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        model_manager.remove_state_listener(on_state_change)
 
 
 @router.delete("/undeploy")
-async def undeploy_model():
+async def undeploy_model(model_manager=Depends(get_model_manager)):
     """Undeploy the current model and free memory."""
+    if model_manager.state == "loading":
+        raise HTTPException(status_code=400, detail="Model is currently loading. Please wait.")
+    
     try:
         model_manager.unload_model()
         return {"message": "Model undeployed successfully"}
@@ -4,113 +4,193 @@ Simple Client Example for Unified Model Deployment API
 Demonstrates how to use the unified API for any model
 """
 
-import requests
+import asyncio
+import httpx
 import json
 import time
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator
 
 # API base URL
 BASE_URL = "http://localhost:8000"
 
-def deploy_model(model_name: str) -> Dict[str, Any]:
-    """Deploy a model."""
-    print(f"🚀 Deploying {model_name}...")
-    
-    payload = {
-        "model_name": model_name,
-        "device": "cpu",
-        "load_in_8bit": False,
-        "load_in_4bit": False,
-        "trust_remote_code": True
-    }
-    
-    response = requests.post(f"{BASE_URL}/deploy", json=payload)
-    
-    if response.status_code == 200:
-        result = response.json()
-        print(f"✅ {result['message']}")
-        return result
-    else:
-        print(f"❌ Error: {response.text}")
-        return {}
+# Request defaults, built once and merged with per-call overrides
+DEFAULT_DEPLOY = {
+    "device": "cpu",
+    "load_in_8bit": False,
+    "load_in_4bit": False,
+    "trust_remote_code": True
+}
 
-def check_status() -> Dict[str, Any]:
-    """Check model status."""
-    print("📊 Checking model status...")
-    
-    response = requests.get(f"{BASE_URL}/status")
-    
-    if response.status_code == 200:
-        result = response.json()
-        print(f"✅ Model: {result.get('model_name', 'Unknown')}")
-        print(f"   Loaded: {result.get('is_loaded', False)}")
-        print(f"   Loading: {result.get('is_loading', False)}")
-        print(f"   Device: {result.get('device', 'Unknown')}")
-        return result
-    else:
-        print(f"❌ Error: {response.text}")
-        return {}
+DEFAULT_QUERY = {
+    "max_length": 256,
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "top_k": 50,
+    "do_sample": True,
+    "num_return_sequences": 1
+}
 
-def query_model(prompt: str, max_length: int = 256) -> Dict[str, Any]:
-    """Query the model."""
-    print(f"🤖 Querying model: {prompt[:50]}...")
+
+class LLMServiceClient:
+    """Async client for the unified model deployment API."""
     
-    payload = {
-        "prompt": prompt,
-        "max_length": max_length,
-        "temperature": 0.7,
-        "top_p": 0.9,
-        "top_k": 50,
-        "do_sample": True,
-        "num_return_sequences": 1
-    }
+    def __init__(self, base_url: str = BASE_URL):
+        self.base_url = base_url
+        # One pooled client so concurrent requests reuse keep-alive connections
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=None)
+        # Last /status body and its ETag, reused when the server answers 304 Not Modified
+        self._last_etag = None
+        self._last_status = {}
     
-    response = requests.post(f"{BASE_URL}/query", json=payload)
+    async def close(self):
+        """Close the underlying HTTP connections."""
+        await self.client.aclose()
     
-    if response.status_code == 200:
-        result = response.json()
-        print(f"✅ Response received in {result.get('generation_time', 0):.2f} seconds")
-        return result
-    else:
-        print(f"❌ Error: {response.text}")
-        return {}
-
-def undeploy_model() -> Dict[str, Any]:
-    """Undeploy the model."""
-    print("🧹 Undeploying model...")
+    async def deploy_model(self, model_name: str, **overrides) -> Dict[str, Any]:
+        """Deploy a model."""
+        print(f"🚀 Deploying {model_name}...")
+        
+        payload = DEFAULT_DEPLOY | {"model_name": model_name} | overrides
+        
+        response = await self.client.post("/deploy", json=payload)
+        
+        # 202 Accepted: the server keeps loading after responding
+        if response.status_code == 202:
+            result = response.json()
+            print(f"✅ {result['message']}")
+            return result
+        else:
+            print(f"❌ Error: {response.text}")
+            return {}
     
-    response = requests.delete(f"{BASE_URL}/undeploy")
+    async def get_status(self) -> Dict[str, Any]:
+        """Check model status."""
+        print("📊 Checking model status...")
+        
+        headers = {"If-None-Match": self._last_etag} if self._last_etag else {}
+        response = await self.client.get("/status", headers=headers)
+        
+        if response.status_code in (200, 304):
+            if response.status_code == 200:
+                self._last_status = response.json()
+                self._last_etag = response.headers.get("ETag")
+            result = self._last_status
+            print(f"✅ Model: {result.get('model_name', 'Unknown')}")
+            print(f"   Loaded: {result.get('is_loaded', False)}")
+            print(f"   Loading: {result.get('is_loading', False)}")
+            print(f"   Device: {result.get('device', 'Unknown')}")
+            if result.get('is_loading') and result.get('load_progress') is not None:
+                print(f"   Downloaded: {result['load_progress']:.0%}")
+            return result
+        else:
+            print(f"❌ Error: {response.text}")
+            return {}
     
-    if response.status_code == 200:
-        result = response.json()
-        print(f"✅ {result['message']}")
-        return result
-    else:
-        print(f"❌ Error: {response.text}")
-        return {}
-
-def wait_for_model_loading(max_wait_time: int = 300) -> bool:
-    """Wait for model to finish loading."""
-    print("⏳ Waiting for model to load...")
+    async def query_model(self, prompt: str, **overrides) -> Dict[str, Any]:
+        """Query the model."""
+        print(f"🤖 Querying model: {prompt[:50]}...")
+        
+        payload = DEFAULT_QUERY | {"prompt": prompt} | overrides
+        
+        response = await self.client.post("/query", json=payload)
+        
+        if response.status_code == 200:
+            result = response.json()
+            print(f"✅ Response received in {result.get('generation_time', 0):.2f} seconds")
+            return result
+        else:
+            print(f"❌ Error: {response.text}")
+            return {}
+    
+    async def stream_query(self, prompt: str, **overrides) -> AsyncIterator[str]:
+        """Query the model, yielding text chunks as the server streams them."""
+        payload = DEFAULT_QUERY | {"prompt": prompt} | overrides
+        
+        async with self.client.stream("POST", "/query/stream", json=payload) as response:
+            if response.status_code != 200:
+                await response.aread()
+                print(f"❌ Error: {response.text}")
+                return
+            
+            event = "message"
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data = line[len("data: "):]
+                    if data == "[DONE]":
+                        return
+                    if event == "error":
+                        print(f"❌ Error: {json.loads(data)['detail']}")
+                        return
+                    yield json.loads(data)["text"]
     
-    start_time = time.time()
-    while time.time() - start_time < max_wait_time:
-        status = check_status()
+    async def undeploy_model(self) -> Dict[str, Any]:
+        """Undeploy the model."""
+        print("🧹 Undeploying model...")
         
-        if status.get('is_loaded', False):
-            print("✅ Model loaded successfully!")
-            return True
-        elif status.get('is_loading', False):
-            print("⏳ Still loading...")
-            time.sleep(10)
+        response = await self.client.delete("/undeploy")
+        
+        if response.status_code == 200:
+            result = response.json()
+            print(f"✅ {result['message']}")
+            return result
         else:
-            print("❌ Model loading failed or stopped")
+            print(f"❌ Error: {response.text}")
+            return {}
+    
+    async def wait_for_model_ready(self, max_wait_time: int = 300) -> bool:
+        """Wait for model to finish loading, woken by server-pushed status events."""
+        print("⏳ Waiting for model to load...")
+        
+        try:
+            import websockets
+        except ImportError:
+            return await self._poll_until_ready(max_wait_time)
+        
+        events_url = self.base_url.replace("http", "ws", 1) + "/events"
+        try:
+            async with websockets.connect(events_url) as ws:
+                deadline = time.time() + max_wait_time
+                while True:
+                    message = json.loads(await asyncio.wait_for(ws.recv(), deadline - time.time()))
+                    
+                    if message["event"] == "loaded":
+                        print("✅ Model loaded successfully!")
+                        return True
+                    elif message["event"] == "loading":
+                        print(f"⏳ Still loading... ({message['status'].get('load_progress') or 0:.0%} downloaded)")
+                    else:
+                        print(f"❌ Model loading failed or stopped: {message['status'].get('load_error')}")
+                        return False
+        except asyncio.TimeoutError:
+            print("⏰ Timeout waiting for model to load")
             return False
+        except (OSError, websockets.exceptions.WebSocketException):
+            # Older servers without /events: fall back to polling /status
+            return await self._poll_until_ready(max_wait_time)
     
-    print("⏰ Timeout waiting for model to load")
-    return False
+    async def _poll_until_ready(self, max_wait_time: int) -> bool:
+        """Poll /status until the model finishes loading."""
+        start_time = time.time()
+        while time.time() - start_time < max_wait_time:
+            status = await self.get_status()
+            
+            if status.get('is_loaded', False):
+                print("✅ Model loaded successfully!")
+                return True
+            elif status.get('is_loading', False):
+                print("⏳ Still loading...")
+                await asyncio.sleep(10)
+            else:
+                print(f"❌ Model loading failed or stopped: {status.get('load_error')}")
+                return False
+        
+        print("⏰ Timeout waiting for model to load")
+        return False
 
-def main():
+
+async def main():
     """Main function demonstrating unified API usage."""
     print("🧪 Unified Model Deployment Client Example")
     print("=" * 50)
@@ -128,6 +208,8 @@ def main():
         "Write a short poem about technology:"
     ]
     
+    client = LLMServiceClient()
+    
     try:
         for i, model_name in enumerate(test_models, 1):
             print(f"\n{'='*60}")
@@ -135,20 +217,21 @@ def main():
             print(f"{'='*60}")
             
             # Step 1: Deploy the model
-            deploy_result = deploy_model(model_name)
+            deploy_result = await client.deploy_model(model_name)
             if not deploy_result:
                 continue
             
             # Step 2: Wait for model to load
-            if not wait_for_model_loading():
+            if not await client.wait_for_model_ready():
                 continue
             
-            # Step 3: Test queries
-            for j, prompt in enumerate(test_prompts, 1):
+            # Step 3: Test queries (sent concurrently so the server can batch them)
+            results = await asyncio.gather(*[client.query_model(prompt) for prompt in test_prompts])
+            
+            for j, (prompt, result) in enumerate(zip(test_prompts, results), 1):
                 print(f"\n  🤖 Query {j}: {prompt}")
                 print("-" * 40)
                 
-                result = query_model(prompt)
                 if result:
                     print(f"  🤖 Response:")
                     print(f"  {result.get('response', 'No response')}")
@@ -157,18 +240,27 @@ def main():
                     print(f"     Input tokens: {result.get('input_tokens', 0)}")
                     print(f"     Output tokens: {result.get('output_tokens', 0)}")
             
-            # Step 4: Clean up
+            # Step 4: Stream one response token by token
+            print(f"\n  📡 Streaming: {test_prompts[0]}")
+            print("  ", end="", flush=True)
+            async for text in client.stream_query(test_prompts[0]):
+                print(text, end="", flush=True)
+            print()
+            
+            # Step 5: Clean up
             print(f"\n  🧹 Cleaning up {model_name}...")
-            undeploy_model()
+            await client.undeploy_model()
             
             print(f"\n  ✅ Test {i} completed successfully!")
         
         print("\n🎉 All tests completed successfully!")
-        
-    except requests.exceptions.ConnectionError:
+    
+    except httpx.ConnectError:
         print("❌ Connection error: Make sure the server is running on http://localhost:8000")
     except Exception as e:
         print(f"❌ Error: {e}")
+    finally:
+        await client.close()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -3,6 +3,7 @@ Configuration settings for the LLM Deployment Service
 """
 
 import os
+import sys
 from typing import Optional
 
 
@@ -17,26 +18,63 @@ class Settings:
     # Server Settings
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    # Each worker process holds its own ModelManager, so deploys are not shared between workers
+    WORKERS: int = int(os.environ.get("WORKERS", 1))
+    # Responses smaller than this are sent uncompressed
+    COMPRESS_MIN_SIZE: int = int(os.environ.get("COMPRESS_MIN_SIZE", 512))
     
     # Model Settings
     DEFAULT_DEVICE: str = "cpu"
+    # Fixed at import: the service is CPU-only, so no per-request CUDA/MPS probing is needed
+    AVAILABLE_DEVICES: frozenset = frozenset({"cpu"})
     DEFAULT_MAX_LENGTH: int = 512
     DEFAULT_TEMPERATURE: float = 0.7
     DEFAULT_TOP_P: float = 0.9
     DEFAULT_TOP_K: int = 50
+    TOKENIZER_CACHE: int = int(os.environ.get("TOKENIZER_CACHE", 1024))  # Cached prompt encodings
     
     # Thread Pool Settings
-    MAX_WORKERS: int = 1
+    MAX_WORKERS: int = 1  # Model loads run one at a time
+    TORCH_NUM_THREADS: int = int(os.environ.get("TORCH_NUM_THREADS", max(1, (os.cpu_count() or 2) // 2)))
+    INFER_WORKERS: int = int(os.environ.get("INFER_WORKERS", max(1, (os.cpu_count() or 1) // TORCH_NUM_THREADS)))
+    
+    # Batching Settings
+    MAX_BATCH: int = int(os.environ.get("MAX_BATCH", 8))
+    MAX_WAIT_MS: float = float(os.environ.get("MAX_WAIT_MS", 10))
+    
+    # Compilation Settings
+    TORCH_COMPILE: bool = os.environ.get("TORCH_COMPILE", "false").lower() in ("1", "true", "yes")
+    TORCH_COMPILE_MODE: str = os.environ.get("TORCH_COMPILE_MODE", "reduce-overhead")
+    IPEX_OPTIMIZE: bool = os.environ.get("IPEX_OPTIMIZE", "true").lower() in ("1", "true", "yes")
+    # Exported and INT8-quantized ONNX models, reused across deploys of the same model
+    ONNX_CACHE_DIR: str = os.environ.get("ONNX_CACHE_DIR", "onnx_cache")
+    # GGUF quantization downloaded for the llama.cpp backend, and its context window
+    LLAMA_CPP_QUANT: str = os.environ.get("LLAMA_CPP_QUANT", "Q4_K_M")
+    LLAMA_CPP_N_CTX: int = int(os.environ.get("LLAMA_CPP_N_CTX", 4096))
+    
+    # Download Settings
+    DOWNLOAD_WORKERS: int = int(os.environ.get("DOWNLOAD_WORKERS", 8))  # Parallel file downloads per deploy
     
     # Memory Settings
     LOW_CPU_MEM_USAGE: bool = True
-    OFFLOAD_FOLDER: str = "offload"
+    # tmpfs keeps offloaded weights in RAM instead of on disk
+    OFFLOAD_FOLDER: str = os.environ.get(
+        "OFFLOAD_FOLDER", "/dev/shm/llm_offload" if sys.platform.startswith("linux") else "offload"
+    )
+    # Budget for cached prompt KV tensors reused across queries (opt-in; 0 disables the prefix cache)
+    PREFIX_CACHE_MB: int = int(os.environ.get("PREFIX_CACHE_MB", 0))
+    # "float" keeps cached prefixes in the model dtype, "int8" quantizes them to fit ~4x more
+    KV_CACHE_DTYPE: str = os.environ.get("KV_CACHE_DTYPE", "float")
+    # Fused torch scaled_dot_product_attention; "eager" restores the per-op attention
+    ATTN_IMPLEMENTATION: str = os.environ.get("ATTN_IMPLEMENTATION", "sdpa")
+    # "auto" uses bfloat16 on CPUs with AMX/AVX512-BF16 and float32 elsewhere
+    MODEL_DTYPE: str = os.environ.get("MODEL_DTYPE", "auto")
     
     # Logging Settings
     LOG_LEVEL: str = "INFO"
     
     # CORS Settings
-    ALLOW_ORIGINS: list = ["*"]
+    ALLOW_ORIGINS: list = [origin.strip() for origin in os.environ.get("ALLOW_ORIGINS", "*").split(",") if origin.strip()]
     ALLOW_CREDENTIALS: bool = True
     ALLOW_METHODS: list = ["*"]
     ALLOW_HEADERS: list = ["*"]
@@ -0,0 +1,87 @@
+"""
+llama.cpp backend for the LLM Deployment Service
+Serves GGUF models through llama-cpp-python's quantized CPU kernels
+"""
+
+import glob
+import logging
+import os
+from typing import Iterator, Tuple
+
+from huggingface_hub import snapshot_download
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_gguf_path(model_name: str, hf_token: str = None) -> str:
+    """Return a local GGUF file for a file path, a local directory, or a Hugging Face repo."""
+    if os.path.isfile(model_name):
+        return model_name
+    
+    pattern = f"*{settings.LLAMA_CPP_QUANT}*.gguf"
+    if os.path.isdir(model_name):
+        model_dir = model_name
+    else:
+        # Only the selected quantization is downloaded, not every GGUF variant in the repo
+        model_dir = snapshot_download(model_name, allow_patterns=[pattern], token=hf_token)
+    
+    # Split GGUF files sort with their first shard first, which is the one llama.cpp opens
+    matches = sorted(glob.glob(os.path.join(model_dir, "**", pattern), recursive=True))
+    if not matches:
+        raise Exception(f"No {settings.LLAMA_CPP_QUANT} GGUF file found for {model_name}")
+    return matches[0]
+
+
+class LlamaCppModel:
+    """Wraps llama_cpp.Llama with the generation calls ModelManager needs."""
+    
+    def __init__(self, model_name: str, hf_token: str = None):
+        from llama_cpp import Llama
+        
+        model_path = resolve_gguf_path(model_name, hf_token)
+        logger.info(f"Loading GGUF weights from {model_path}")
+        
+        # mmap maps the weights straight from the page cache; mlock is left off so the OS may page them
+        self.llm = Llama(
+            model_path=model_path,
+            n_ctx=settings.LLAMA_CPP_N_CTX,
+            n_threads=settings.TORCH_NUM_THREADS,
+            use_mmap=True,
+            use_mlock=False,
+            verbose=False
+        )
+        self.device = "cpu"
+        self.quantization = f"gguf_{settings.LLAMA_CPP_QUANT.lower()}"
+    
+    def count_tokens(self, prompt: str) -> int:
+        """Count prompt tokens with the model's own tokenizer."""
+        return len(self.llm.tokenize(prompt.encode("utf-8")))
+    
+    def _sampling_kwargs(self, max_new_tokens: int, temperature: float, top_p: float,
+                         top_k: int, do_sample: bool):
+        """Map the service's generation parameters onto llama.cpp's; temperature 0 is greedy."""
+        return {
+            "max_tokens": max_new_tokens,
+            "temperature": temperature if do_sample else 0.0,
+            "top_p": top_p,
+            "top_k": top_k,
+        }
+    
+    def generate(self, prompt: str, max_new_tokens: int, temperature: float, top_p: float,
+                 top_k: int, do_sample: bool) -> Tuple[str, int, int]:
+        """Return (text, input_tokens, output_tokens) for one completion."""
+        result = self.llm(prompt, stream=False,
+                          **self._sampling_kwargs(max_new_tokens, temperature, top_p, top_k, do_sample))
+        usage = result["usage"]
+        return result["choices"][0]["text"].strip(), usage["prompt_tokens"], usage["completion_tokens"]
+    
+    def stream(self, prompt: str, max_new_tokens: int, temperature: float, top_p: float,
+               top_k: int, do_sample: bool) -> Iterator[str]:
+        """Yield completion text chunks as llama.cpp produces them."""
+        for chunk in self.llm(prompt, stream=True,
+                              **self._sampling_kwargs(max_new_tokens, temperature, top_p, top_k, do_sample)):
+            text = chunk["choices"][0]["text"]
+            if text:
+                yield text
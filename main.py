@@ -2,34 +2,68 @@
 Main FastAPI application for the LLM Deployment Service
 """
 
+import asyncio
+import importlib.util
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
 from config import settings
-from utils import setup_logging
-from api_routes import router
+from utils import setup_logging, configure_openmp_env
+from middleware import StaticCORSMiddleware
+from api_routes import router, batch_worker
 
 # Setup logging
 setup_logging(settings.LOG_LEVEL)
 
+# zstd response compression is optional; without zstd-asgi responses are gzipped
+_HAS_ZSTD_ASGI = importlib.util.find_spec("zstd_asgi") is not None
+
+# Size the native thread pools before torch is imported by the first model route
+configure_openmp_env(settings.TORCH_NUM_THREADS, pin_threads=settings.INFER_WORKERS == 1)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the query batching worker for the lifetime of the app."""
+    worker = asyncio.create_task(batch_worker())
+    yield
+    worker.cancel()
+
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.API_TITLE,
     description=settings.API_DESCRIPTION,
-    version=settings.API_VERSION
+    version=settings.API_VERSION,
+    lifespan=lifespan
 )
 
-# Add CORS middleware
+# Add CORS middleware (headers precomputed once, preflights answered without routing)
 app.add_middleware(
-    CORSMiddleware,
+    StaticCORSMiddleware,
     allow_origins=settings.ALLOW_ORIGINS,
     allow_credentials=settings.ALLOW_CREDENTIALS,
     allow_methods=settings.ALLOW_METHODS,
     allow_headers=settings.ALLOW_HEADERS,
 )
 
+# Compress generated text on the wire: zstd for clients that accept it, gzip otherwise.
+# Server-sent events are left uncompressed so each chunk is delivered as soon as it is produced
+if _HAS_ZSTD_ASGI:
+    from zstd_asgi import ZstdMiddleware
+    app.add_middleware(
+        ZstdMiddleware,
+        minimum_size=settings.COMPRESS_MIN_SIZE,
+        gzip_fallback=True,
+        excluded_handlers=[r"^/query/stream$"],
+    )
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.COMPRESS_MIN_SIZE)
+
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="."), name="static")
@@ -46,4 +80,25 @@ async def web_interface():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host=settings.HOST, port=settings.PORT)
+    
+    # Prefer the C event loop and HTTP parser when they are installed
+    try:
+        import uvloop  # noqa: F401
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+    
+    try:
+        import httptools  # noqa: F401
+        http = "httptools"
+    except ImportError:
+        http = "h11"
+    
+    uvicorn.run(
+        "main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        loop=loop,
+        http=http,
+        workers=settings.WORKERS
+    )
@@ -5,7 +5,7 @@ Checks system resources and provides recommendations for model deployment
 """
 
 import sys
-from utils import check_system_resources, get_model_recommendations, is_large_model
+from utils import get_system_status_and_recommendations, is_large_model
 
 def main():
     """Main function for memory check."""
@@ -13,7 +13,7 @@ def main():
     print("=" * 50)
     
     # Check system resources
-    resources = check_system_resources()
+    resources, recommendations = get_system_status_and_recommendations()
     
     if not resources:
         print("❌ Error: Could not check system resources")
@@ -56,8 +56,7 @@ def main():
         print("   ⚠️  Limited disk space for model caching")
         print("   💡 Clear some space or use smaller models")
     
-    # Get model recommendations
-    recommendations = get_model_recommendations(memory['available_gb'])
+    # Model recommendations for the available RAM
     print(f"\n🚀 Recommended Models for {memory['available_gb']:.1f}GB RAM:")
     for model in recommendations:
         print(f"   • {model}")
@@ -0,0 +1,109 @@
+"""
+ASGI middleware for the LLM Deployment Service
+"""
+
+from typing import Sequence
+
+
+SAFE_METHODS = "DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+
+# CORS-safelisted request headers, which preflights may always name
+SAFELISTED_HEADERS = frozenset({b"accept", b"accept-language", b"content-language", b"content-type"})
+
+
+class StaticCORSMiddleware:
+    """Minimal CORS middleware whose header values are computed once at startup."""
+    
+    def __init__(self, app, allow_origins: Sequence[str], allow_credentials: bool = False,
+                 allow_methods: Sequence[str] = ("GET",), allow_headers: Sequence[str] = (), max_age: int = 600):
+        self.app = app
+        self.allow_all_origins = "*" in allow_origins
+        self.allow_origins = frozenset(origin.encode("latin-1") for origin in allow_origins)
+        self.allow_all_headers = "*" in allow_headers
+        
+        # Headers added to every CORS response
+        self.simple_headers = []
+        if allow_credentials:
+            self.simple_headers.append((b"access-control-allow-credentials", b"true"))
+        
+        # With credentials the origin must be echoed back; "*" is only valid without them
+        self.echo_origin = allow_credentials or not self.allow_all_origins
+        if self.echo_origin:
+            self.simple_headers.append((b"vary", b"Origin"))
+        
+        methods = SAFE_METHODS if "*" in allow_methods else ", ".join(allow_methods)
+        self.allow_methods = frozenset(method.encode("latin-1") for method in methods.split(", "))
+        self.allowed_headers = SAFELISTED_HEADERS | frozenset(
+            header.lower().encode("latin-1") for header in allow_headers
+        )
+        self.preflight_headers = self.simple_headers + [
+            (b"access-control-allow-methods", methods.encode("latin-1")),
+            (b"access-control-max-age", str(max_age).encode("latin-1")),
+        ]
+        if not self.allow_all_headers:
+            self.preflight_headers.append(
+                (b"access-control-allow-headers", ", ".join(allow_headers).encode("latin-1"))
+            )
+    
+    def _allow_origin_value(self, origin: bytes) -> bytes:
+        """Return the Access-Control-Allow-Origin value for an allowed origin."""
+        return origin if self.echo_origin else b"*"
+    
+    def _preflight_failures(self, request_method: bytes, request_headers: bytes) -> list:
+        """List which parts of a preflight request are not allowed, as Starlette's CORSMiddleware does."""
+        failures = []
+        if request_method not in self.allow_methods:
+            failures.append("method")
+        if not self.allow_all_headers and request_headers is not None:
+            requested = {header.strip().lower() for header in request_headers.split(b",")}
+            if not requested <= self.allowed_headers | {b""}:
+                failures.append("headers")
+        return failures
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        origin = None
+        request_method = None
+        request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+        
+        # Same-origin and disallowed requests pass through untouched
+        if origin is None or not (self.allow_all_origins or origin in self.allow_origins):
+            await self.app(scope, receive, send)
+            return
+        
+        cors_origin = (b"access-control-allow-origin", self._allow_origin_value(origin))
+        
+        # Answer preflight requests directly without entering the app
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            headers = [cors_origin] + self.preflight_headers
+            failures = self._preflight_failures(request_method, request_headers)
+            if failures:
+                body = f"Disallowed CORS {', '.join(failures)}".encode("latin-1")
+                headers.append((b"content-type", b"text/plain; charset=utf-8"))
+                headers.append((b"content-length", str(len(body)).encode("latin-1")))
+                await send({"type": "http.response.start", "status": 400, "headers": headers})
+                await send({"type": "http.response.body", "body": body})
+                return
+            
+            if self.allow_all_headers and request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+            await send({"type": "http.response.start", "status": 204, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [cors_origin] + self.simple_headers
+            await send(message)
+        
+        await self.app(scope, receive, send_with_cors)
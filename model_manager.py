@@ -3,17 +3,67 @@ Model Manager for LLM Deployment Service
 Handles model loading, unloading, and management operations
 """
 
+import copy
+import functools
+import importlib.util
+import os
+import queue
+import threading
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+from concurrent.futures import Executor, Future
+from huggingface_hub import snapshot_download
+from huggingface_hub.utils import tqdm as hf_tqdm
+from transformers import (
+    AutoTokenizer, AutoModelForCausalLM, GenerationConfig, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+)
 import logging
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Iterator, Callable, Literal
 
-from utils import is_large_model, format_error_message
+from llama_cpp_backend import LlamaCppModel
+from prefix_cache import PrefixKVCache
+from utils import is_large_model, format_error_message, supports_int8_vnni, supports_native_bf16
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Optional backends, probed once at import instead of on every load
+_HAS_IPEX_LLM = importlib.util.find_spec("ipex_llm") is not None
+_HAS_IPEX = importlib.util.find_spec("intel_extension_for_pytorch") is not None
+_HAS_OPTIMUM = importlib.util.find_spec("optimum") is not None and importlib.util.find_spec("onnxruntime") is not None
+_HAS_LLAMA_CPP = importlib.util.find_spec("llama_cpp") is not None
+
+# Lifecycle of the single deployed model: empty -> loading -> ready -> unloading -> empty
+ModelState = Literal["empty", "loading", "ready", "unloading"]
+
+
+class StopOnEvent(StoppingCriteria):
+    """Stops generate() at the next token once the event is set, e.g. by a disconnected client."""
+    
+    def __init__(self, stop_event: threading.Event):
+        self.stop_event = stop_event
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.stop_event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+def get_model_dtype() -> torch.dtype:
+    """Resolve the configured model dtype; "auto" picks bfloat16 only on CPUs with native bf16."""
+    if settings.MODEL_DTYPE == "auto":
+        return torch.bfloat16 if supports_native_bf16() else torch.float32
+    return getattr(torch, settings.MODEL_DTYPE)
+
+
+def configure_cpu_threads(num_threads: int):
+    """Pin PyTorch's intra-op pool and disable inter-op threading to avoid oversubscription."""
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Inter-op threads can only be set before any parallel work has started
+        logger.warning("Could not set inter-op threads; parallel work already started")
+    logger.info(f"Using {num_threads} intra-op threads for inference")
+
 
 class ModelManager:
     """Manages the lifecycle of LLM models."""
@@ -21,21 +71,58 @@ class ModelManager:
     def __init__(self):
         self.model = None
         self.tokenizer = None
-        self.generator = None
+        self.generation_config = None
         self.model_name = None
-        self.is_loading = False
+        self.quantization = None
+        self.backend = "pytorch"
+        self.dtype = torch.float32
+        self.state: ModelState = "empty"
+        self.load_progress = None  # Fraction of model files downloaded by the current/last deploy
+        self.load_error = None  # Error message of the last failed deploy
+        self.slow_tokenizer = False  # True when only the Python tokenizer could be loaded
+        # Reusable prompt KV tensors; only used with models that keep the standard HF cache
+        self.prefix_cache = (
+            PrefixKVCache(settings.PREFIX_CACHE_MB * 1024 * 1024, settings.KV_CACHE_DTYPE)
+            if settings.PREFIX_CACHE_MB > 0 else None
+        )
+        self.use_prefix_cache = False
+        self.state_version = 0
+        self._state_listeners = []
+        # The fast tokenizer mutates its truncation settings per call, so concurrent
+        # encodes with different max_length values fail with "Already borrowed"
+        self._tokenize_lock = threading.Lock()
+        self._reset_encode_cache()
+        self._cached_status = (self._build_status(), self.state_version)
+    
+    @property
+    def is_loading(self) -> bool:
+        """Whether a deploy is currently in progress."""
+        return self.state == "loading"
     
     def get_device(self, device_preference: str) -> str:
         """Determine the best available device (CPU-only)."""
-        # Force CPU usage for VM compatibility
-        return "cpu"
+        # Anything outside the precomputed device set falls back to CPU for VM compatibility
+        if device_preference in settings.AVAILABLE_DEVICES:
+            return device_preference
+        return settings.DEFAULT_DEVICE
     
     def load_model_sync(self, model_name: str, device: str, load_in_8bit: bool, 
-                        load_in_4bit: bool, trust_remote_code: bool, hf_token: str = None):
+                        load_in_4bit: bool, trust_remote_code: bool, hf_token: str = None,
+                        load_in_8bit_cpu: bool = False, backend: str = "pytorch"):
         """Load model synchronously in a separate thread."""
         try:
             logger.info(f"Loading model: {model_name}")
-            self.is_loading = True
+            self.state = "loading"
+            self.load_progress = 0.0
+            self.load_error = None
+            self.slow_tokenizer = False
+            self.quantization = None
+            self.backend = "pytorch"
+            self.dtype = get_model_dtype()
+            self.use_prefix_cache = False
+            if self.prefix_cache is not None:
+                self.prefix_cache.clear()
+            self._bump_version()
             
             # Special handling for large models
             is_large_model_flag = is_large_model(model_name)
@@ -44,83 +131,142 @@ class ModelManager:
                 logger.info("Detected large model - applying memory optimizations")
                 # Force CPU-only for large models
                 device = "cpu"
-                load_in_8bit = False
-                load_in_4bit = False
             
-            # Check for quantization dependencies
+            # Low-bit weights on CPU need ipex-llm and int8 dot-product instructions
+            low_bit_model_cls = None
             if load_in_8bit or load_in_4bit:
-                try:
-                    import accelerate
-                    import bitsandbytes
-                    logger.info("Quantization dependencies found")
-                except ImportError as e:
-                    logger.warning(f"Quantization dependencies not found: {e}")
+                if not supports_int8_vnni():
+                    logger.warning("CPU lacks AVX512-VNNI/AMX int8 support")
                     logger.warning("Falling back to full precision loading")
-                    load_in_8bit = False
-                    load_in_4bit = False
+                elif not _HAS_IPEX_LLM:
+                    logger.warning("Quantization dependencies not found: ipex-llm is not installed")
+                    logger.warning("Falling back to full precision loading")
+                else:
+                    from ipex_llm.transformers import AutoModelForCausalLM as low_bit_model_cls
+                    logger.info("Quantization dependencies found")
             
-
+            if low_bit_model_cls is None:
+                load_in_8bit = False
+                load_in_4bit = False
+            
+            # The ONNX Runtime backend exports and quantizes through optimum
+            if backend == "onnx" and not _HAS_OPTIMUM:
+                logger.warning("ONNX Runtime dependencies not found: optimum[onnxruntime] is not installed")
+                logger.warning("Falling back to the PyTorch backend")
+                backend = "pytorch"
+            
+            # GGUF repos are served by llama.cpp with its own tokenizer and quantized kernels
+            if backend == "llama.cpp" or "gguf" in model_name.lower():
+                if _HAS_LLAMA_CPP:
+                    backend = "llama.cpp"
+                else:
+                    logger.warning("llama.cpp dependencies not found: llama-cpp-python is not installed")
+                    logger.warning("Falling back to the PyTorch backend")
+                    backend = "pytorch"
+            
+            if backend == "llama.cpp":
+                self.model = LlamaCppModel(model_name, hf_token)
+                self.quantization = self.model.quantization
+                self.backend = backend
+                self.load_progress = 1.0
+                
+                logger.info(f"Model {model_name} loaded successfully with llama.cpp")
+                self.state = "ready"
+                self._bump_version()
+                return
             
-            # Standard approach for other models
-            # Load tokenizer with fallback options
-            tokenizer_kwargs = {"trust_remote_code": trust_remote_code}
+            # Fetch every file up front with parallel downloads; the loads below read the local snapshot
+            model_path = self._download_model(model_name, hf_token)
+            
+            # Load the Rust tokenizer from the snapshot; other errors are real failures, not a reason to go slow
+            tokenizer_kwargs = {"trust_remote_code": trust_remote_code, "use_fast": True}
             if hf_token:
                 tokenizer_kwargs["token"] = hf_token
             
             try:
-                # Try loading with fast tokenizer first
                 self.tokenizer = AutoTokenizer.from_pretrained(
-                    model_name,
+                    model_path,
                     **tokenizer_kwargs
                 )
-            except Exception as e:
-                logger.warning(f"Fast tokenizer failed: {e}")
-                logger.info("Trying with use_fast=False...")
+            except OSError as e:
+                logger.warning(f"Fast tokenizer files unavailable: {e}")
+                logger.warning("Falling back to the slow Python tokenizer; tokenization will be much slower")
                 
-                # Fallback to slow tokenizer
                 tokenizer_kwargs["use_fast"] = False
                 self.tokenizer = AutoTokenizer.from_pretrained(
-                    model_name,
+                    model_path,
                     **tokenizer_kwargs
                 )
+                self.slow_tokenizer = True
             
             # Add padding token if not present
             if self.tokenizer.pad_token is None:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
             
-            # Load model with optimizations for large models
+            # Left-pad batched prompts so every row continues from its own last token
+            self.tokenizer.padding_side = "left"
+            self._reset_encode_cache()
+            
+            # safetensors shards are preferred (and memory-mapped) when present; .bin weights still load
             model_kwargs = {
                 "trust_remote_code": trust_remote_code,
                 "device_map": None,  # Force CPU loading
+                "low_cpu_mem_usage": True,
+                "torch_dtype": self.dtype,  # Ensure consistent dtype
+                "attn_implementation": settings.ATTN_IMPLEMENTATION,
             }
             
             # Memory optimizations for large models
             if is_large_model_flag:
                 logger.info("Applying memory optimizations for large model")
-                model_kwargs.update({
-                    "low_cpu_mem_usage": True,
-                    "torch_dtype": torch.float32,  # Use torch_dtype instead of dtype
-                    "offload_folder": "offload",  # Enable model offloading
-                })
-            else:
-                model_kwargs.update({
-                    "low_cpu_mem_usage": True,
-                    "torch_dtype": torch.float32,  # Ensure consistent dtype
-                })
+                model_kwargs["offload_folder"] = settings.OFFLOAD_FOLDER  # Enable model offloading
             
             if hf_token:
                 model_kwargs["token"] = hf_token
             
             try:
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    model_name,
-                    **model_kwargs
-                )
+                if backend == "onnx":
+                    self.model = self._load_onnx_model(model_name, model_path, trust_remote_code, hf_token)
+                    self.quantization = "onnx_int8"
+                    self.backend = backend
+                elif low_bit_model_cls is not None:
+                    # Weight-only quantization: INT4 or symmetric INT8 linear layers
+                    self.quantization = "sym_int4" if load_in_4bit else "sym_int8"
+                    logger.info(f"Loading quantized weights: {self.quantization}")
+                    
+                    low_bit_kwargs = {"trust_remote_code": trust_remote_code}
+                    if load_in_4bit:
+                        low_bit_kwargs["load_in_4bit"] = True
+                    else:
+                        low_bit_kwargs["load_in_low_bit"] = "sym_int8"
+                    if hf_token:
+                        low_bit_kwargs["token"] = hf_token
+                    
+                    self.model = low_bit_model_cls.from_pretrained(
+                        model_path,
+                        **low_bit_kwargs
+                    )
+                else:
+                    try:
+                        self.model = AutoModelForCausalLM.from_pretrained(
+                            model_path,
+                            **model_kwargs
+                        )
+                    except ValueError as e:
+                        # Architectures without an SDPA path reject it; keep the other optimizations
+                        logger.warning(f"{settings.ATTN_IMPLEMENTATION} attention unavailable: {e}")
+                        model_kwargs.pop("attn_implementation")
+                        self.model = AutoModelForCausalLM.from_pretrained(
+                            model_path,
+                            **model_kwargs
+                        )
             except Exception as e:
                 logger.warning(f"Model loading failed with optimizations: {e}")
                 logger.info("Trying with minimal settings...")
                 
-                # Fallback to minimal settings
+                # Fallback to minimal settings (full precision)
+                self.quantization = None
+                self.backend = "pytorch"
                 fallback_kwargs = {
                     "trust_remote_code": trust_remote_code,
                     "device_map": None,
@@ -129,61 +275,235 @@ class ModelManager:
                     fallback_kwargs["token"] = hf_token
                 
                 self.model = AutoModelForCausalLM.from_pretrained(
-                    model_name,
+                    model_path,
                     **fallback_kwargs
                 )
             
-            # Ensure model is on CPU and has consistent dtype
-            self.model = self.model.to("cpu")
+            # from_pretrained with device_map=None already returns a CPU model; only move it if not
+            if getattr(self.model, "device", None) is not None and self.model.device.type != "cpu":
+                self.model = self.model.to("cpu")
             
-            # Convert model to float32 to avoid dtype conflicts
-            if hasattr(self.model, 'to'):
-                self.model = self.model.to(torch.float32)
+            # Convert model to a single dtype to avoid dtype conflicts (quantized weights stay low-bit)
+            if self.quantization is None and getattr(self.model, "dtype", self.dtype) != self.dtype:
+                self.model = self.model.to(self.dtype)
             
             # Set model to evaluation mode
             if hasattr(self.model, 'eval'):
                 self.model.eval()
             
-            # Create text generation pipeline with optimizations for large models
-            pipeline_kwargs = {
-                "model": self.model,
-                "tokenizer": self.tokenizer,
-                "device": "cpu",
-            }
+            # Server-wide generation defaults, built once and copied per request
+            self.generation_config = copy.deepcopy(getattr(self.model, "generation_config", None) or GenerationConfig())
+            self.generation_config.update(
+                pad_token_id=self.tokenizer.pad_token_id,
+                use_cache=True  # Reuse past key/values so each decode step is O(t), not O(t^2)
+            )
             
-            # Add optimizations for large models
-            if is_large_model_flag:
-                logger.info("Applying pipeline optimizations for large model")
-                pipeline_kwargs.update({
-                    "model_kwargs": {"low_cpu_mem_usage": True},
-                })
+            # Dynamic INT8 quantization of Linear layers with PyTorch's own CPU kernels
+            if load_in_8bit_cpu and self.quantization is None:
+                self._quantize_dynamic_int8()
+            
+            # Fuse ops with Intel Extension for PyTorch when it is installed
+            ipex_optimized = False
+            if settings.IPEX_OPTIMIZE and self.quantization is None:
+                ipex_optimized = self._optimize_with_ipex()
             
-            self.generator = pipeline("text-generation", **pipeline_kwargs)
+            # Compile the decoder forward pass so compilation happens inside /deploy
+            if settings.TORCH_COMPILE and self.quantization is None and not ipex_optimized:
+                self._compile_model()
+            
+            # IPEX, ipex-llm and ONNX Runtime models manage their own KV cache layout
+            self.use_prefix_cache = (self.prefix_cache is not None and not ipex_optimized
+                                     and self.quantization in (None, "dynamic_int8"))
             
             logger.info(f"Model {model_name} loaded successfully on {device}")
-            self.is_loading = False
+            self.state = "ready"
+            self._bump_version()
             
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
-            self.is_loading = False
             
             # Provide helpful error message with alternative models
             error_msg = format_error_message(str(e))
+            # Drop anything partially loaded so the manager is back to a clean empty state
+            self.model = None
+            self.tokenizer = None
+            self.state = "empty"
+            self.load_error = error_msg
+            self._bump_version()
             raise Exception(error_msg)
     
+    def _download_model(self, model_name: str, hf_token: str = None) -> str:
+        """Download a Hub model's config, tokenizer and weights in parallel; returns a local path."""
+        if os.path.isdir(model_name):
+            self._set_load_progress(1.0)
+            return model_name
+        
+        download_kwargs = {
+            "max_workers": settings.DOWNLOAD_WORKERS,
+            "token": hf_token,
+            "tqdm_class": self._download_progress_class(),
+        }
+        try:
+            logger.info(f"Downloading {model_name} with {settings.DOWNLOAD_WORKERS} workers...")
+            model_path = snapshot_download(
+                model_name,
+                allow_patterns=["*.json", "*.safetensors", "*tokenizer*", "*.model", "*.txt", "*.py", "*.tiktoken"],
+                ignore_patterns=["consolidated*"],  # Duplicate single-file weights some repos ship
+                **download_kwargs
+            )
+            
+            # Repos without safetensors only publish PyTorch pickles
+            if not any(name.endswith(".safetensors") for _, _, files in os.walk(model_path) for name in files):
+                logger.info("No safetensors weights found, downloading PyTorch weights")
+                model_path = snapshot_download(model_name, allow_patterns=["*.bin"], **download_kwargs)
+            
+            self._set_load_progress(1.0)
+            return model_path
+        except Exception as e:
+            # Let from_pretrained resolve the name itself and report the underlying error
+            logger.warning(f"Snapshot download failed: {e}")
+            return model_name
+    
+    def _download_progress_class(self):
+        """Build a tqdm class that mirrors snapshot_download's per-file progress into load_progress."""
+        manager = self
+        
+        class DownloadProgress(hf_tqdm):
+            # snapshot_download iterates this bar once per finished file
+            def __iter__(self):
+                for done, item in enumerate(super().__iter__(), 1):
+                    if self.total:
+                        manager._set_load_progress(done / self.total)
+                    yield item
+        
+        return DownloadProgress
+    
+    def _set_load_progress(self, progress: float):
+        """Record download progress, publishing a new status only when it visibly changes."""
+        progress = round(progress, 2)
+        if progress != self.load_progress:
+            self.load_progress = progress
+            self._bump_version()
+    
+    def _load_onnx_model(self, model_name: str, model_path: str, trust_remote_code: bool, hf_token: str = None):
+        """Export a model to ONNX, quantize it to INT8 once (cached by name), and load it into ONNX Runtime."""
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForCausalLM, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        
+        export_dir = os.path.join(settings.ONNX_CACHE_DIR, model_name.strip("/").replace("/", "--"))
+        quantized_dir = os.path.join(export_dir, "quantized")
+        quantized_file = "model_quantized.onnx"
+        
+        if not os.path.exists(os.path.join(quantized_dir, quantized_file)):
+            logger.info(f"Exporting {model_name} to ONNX in {export_dir}...")
+            export_kwargs = {"export": True, "provider": "CPUExecutionProvider", "trust_remote_code": trust_remote_code}
+            if hf_token:
+                export_kwargs["token"] = hf_token
+            exported = ORTModelForCausalLM.from_pretrained(model_path, **export_kwargs)
+            exported.save_pretrained(export_dir)
+            
+            # Dynamic quantization: weights stored as INT8, activations quantized per batch
+            if supports_int8_vnni():
+                quantization_config = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            else:
+                quantization_config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            ORTQuantizer.from_pretrained(exported).quantize(
+                save_dir=quantized_dir,
+                quantization_config=quantization_config
+            )
+            del exported
+        
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model = ORTModelForCausalLM.from_pretrained(
+            quantized_dir,
+            file_name=quantized_file,
+            provider="CPUExecutionProvider",
+            session_options=session_options,
+            use_cache=True
+        )
+        
+        # Warm up so the first request does not pay session initialization
+        dummy_ids = torch.full((1, 2), self.tokenizer.eos_token_id)
+        model.generate(dummy_ids, attention_mask=torch.ones_like(dummy_ids), max_new_tokens=2,
+                       pad_token_id=self.tokenizer.pad_token_id)
+        logger.info(f"Loaded ONNX Runtime model from {quantized_dir}")
+        return model
+    
+    def _quantize_dynamic_int8(self):
+        """Swap nn.Linear layers for dynamically quantized INT8 versions."""
+        engine = torch.backends.quantized.engine
+        if engine == "none" or engine not in torch.backends.quantized.supported_engines:
+            logger.warning("No quantized CPU engine available; keeping full precision weights")
+            return
+        
+        logger.info(f"CPU capability: {torch.backends.cpu.get_cpu_capability()}, quantized engine: {engine}")
+        
+        # Dynamic quantization expects float32 weights as its input
+        if self.dtype != torch.float32:
+            self.dtype = torch.float32
+            self.model = self.model.to(self.dtype)
+        
+        self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.quantization = "dynamic_int8"
+        logger.info("Applied dynamic INT8 quantization to linear layers")
+    
+    def _optimize_with_ipex(self) -> bool:
+        """Apply ipex.llm.optimize in the model's dtype; returns False if IPEX is unavailable."""
+        if not _HAS_IPEX:
+            return False
+        
+        try:
+            import intel_extension_for_pytorch as ipex
+            
+            # bfloat16 is only selected when the CPU runs it natively (see get_model_dtype)
+            self.model = ipex.llm.optimize(self.model, dtype=self.dtype, inplace=True)
+            logger.info(f"Optimized model with IPEX ({self.dtype})")
+            return True
+        except Exception as e:
+            logger.warning(f"IPEX optimization failed, using stock PyTorch: {e}")
+            return False
+    
+    def _compile_model(self):
+        """Compile the model forward pass with torch.compile and warm it up."""
+        try:
+            logger.info("Compiling model with torch.compile...")
+            self.model.forward = torch.compile(
+                self.model.forward,
+                backend="inductor",
+                mode=settings.TORCH_COMPILE_MODE,
+                dynamic=True
+            )
+            
+            # Short generations compile prefill and decode; batch size 1 is always specialized
+            # by the compiler, so warm up a single prompt and a small batch separately
+            for batch_size in (1, 2):
+                dummy_ids = torch.full((batch_size, 2), self.tokenizer.eos_token_id)
+                with torch.inference_mode():
+                    self.model.generate(
+                        dummy_ids,
+                        attention_mask=torch.ones_like(dummy_ids),
+                        max_new_tokens=2,
+                        pad_token_id=self.tokenizer.pad_token_id
+                    )
+            logger.info("Model compiled successfully")
+        except Exception as e:
+            logger.warning(f"torch.compile failed, using eager mode: {e}")
+            # Drop the instance override so the original forward is used again
+            self.model.__dict__.pop("forward", None)
+    
     def unload_model(self):
         """Unload the current model and free memory."""
-        if self.model is None and self.generator is None:
+        if self.state != "ready":
             raise Exception("No model is currently loaded.")
         
+        self.state = "unloading"
+        self._bump_version()
         try:
-            # Clear model references
-            if self.model is not None:
-                del self.model
-            if self.tokenizer is not None:
-                del self.tokenizer
-            if self.generator is not None:
-                del self.generator
+            # Drop the model references; the attributes stay defined for the error handler below
+            self.model = None
+            self.tokenizer = None
             
             # Force garbage collection
             import gc
@@ -192,42 +512,43 @@ class ModelManager:
             # CPU-only: no CUDA cache to clear
             pass
             
-            self.model = None
-            self.tokenizer = None
-            self.generator = None
+            self.state = "empty"
+            self.generation_config = None
             self.model_name = None
+            self.quantization = None
+            self.backend = "pytorch"
+            self.load_progress = None
+            self.slow_tokenizer = False
+            self.use_prefix_cache = False
+            if self.prefix_cache is not None:
+                self.prefix_cache.clear()
+            self._reset_encode_cache()
+            self._bump_version()
             
             logger.info("Model undeployed successfully")
             
         except Exception as e:
             logger.error(f"Error undeploying model: {str(e)}")
+            self.state = "ready" if self.model is not None and self.tokenizer is not None else "empty"
+            self._bump_version()
             raise Exception(f"Undeploy error: {str(e)}")
     
     def generate_response(self, prompt: str, max_length: int = 512, max_new_tokens: int = None,
                           temperature: float = 0.7, top_p: float = 0.9, top_k: int = 50, 
                           do_sample: bool = True, num_return_sequences: int = 1) -> Dict[str, Any]:
         """Generate a response using the loaded model."""
-        if self.generator is None:
-            raise Exception("No model is currently loaded. Please deploy a model first.")
+        self._require_ready()
         
-        if self.is_loading:
-            raise Exception("Model is currently loading. Please wait.")
+        if self.backend == "llama.cpp":
+            return self._generate_llama_cpp(prompt, max_length, max_new_tokens, temperature, top_p, top_k, do_sample)
         
         try:
             start_time = time.time()
             
-            # Standard approach for all models
-            if self.model is None or self.tokenizer is None:
-                raise Exception("Model or tokenizer not properly loaded.")
-            
-            # Tokenize input with explicit truncation
-            inputs = self.tokenizer(
-                prompt, 
-                return_tensors="pt",
-                truncation=True,
-                max_length=max_length
-            )
-            input_tokens = inputs.input_ids.shape[1]
+            # Tokenize input with explicit truncation (cached for repeated prompts)
+            prompt_ids = self._encode_cache(prompt, max_length)
+            input_ids = torch.as_tensor(prompt_ids).unsqueeze(0)
+            input_tokens = input_ids.shape[1]
             
             # Calculate max_new_tokens (avoiding conflict with max_length)
             if max_new_tokens is None:
@@ -237,24 +558,38 @@ class ModelManager:
             
             # Generate response
             generation_kwargs = {
-                "max_new_tokens": max_new_tokens,  # Use max_new_tokens instead of max_length
-                "temperature": temperature,
-                "top_p": top_p,
-                "top_k": top_k,
-                "do_sample": do_sample,
-                "num_return_sequences": num_return_sequences,
-                "pad_token_id": self.tokenizer.eos_token_id,
+                "attention_mask": torch.ones_like(input_ids),
+                "generation_config": self._request_generation_config(
+                    max_new_tokens=max_new_tokens,  # Use max_new_tokens instead of max_length
+                    temperature=temperature,
+                    top_p=top_p,
+                    top_k=top_k,
+                    do_sample=do_sample,
+                    num_return_sequences=num_return_sequences,
+                    return_dict_in_generate=True
+                ),
             }
             
-            # Generate using pipeline
-            outputs = self.generator(prompt, **generation_kwargs)
+            # Start from the KV tensors of the longest previously seen prefix so only new tokens are prefilled
+            use_prefix_cache = self.use_prefix_cache and num_return_sequences == 1
+            if use_prefix_cache:
+                cached_tokens, past_key_values = self.prefix_cache.lookup(prompt_ids, self.model.config)
+                if past_key_values is not None:
+                    logger.debug(f"Prefix cache hit: {cached_tokens}/{input_tokens} prompt tokens")
+                    generation_kwargs["past_key_values"] = past_key_values
             
-            # Extract generated text
-            generated_text = outputs[0]['generated_text']
-            response_text = generated_text[len(prompt):].strip()
+            # inference_mode also skips the autograd version counters no_grad still keeps
+            with torch.inference_mode():
+                outputs = self.model.generate(input_ids, **generation_kwargs)
             
-            # Count output tokens
-            output_tokens = len(self.tokenizer.encode(response_text))
+            # Count and decode only the newly generated tokens; no re-encoding of the text
+            generated_ids = outputs.sequences[0, input_tokens:]
+            generated_ids = generated_ids[generated_ids != self.tokenizer.pad_token_id]
+            output_tokens = len(generated_ids)
+            response_text = self.tokenizer.decode(generated_ids, skip_special_tokens=True).strip()
+            
+            if use_prefix_cache and outputs.past_key_values is not None:
+                self.prefix_cache.insert(prompt_ids, outputs.past_key_values)
             
             generation_time = time.time() - start_time
             
@@ -269,35 +604,263 @@ class ModelManager:
         except Exception as e:
             logger.error(f"Error during generation: {str(e)}")
             logger.error(f"Model dtype: {self.model.dtype if hasattr(self.model, 'dtype') else 'unknown'}")
-            logger.error(f"Input shape: {inputs.input_ids.shape if 'inputs' in locals() else 'unknown'}")
+            logger.error(f"Input shape: {input_ids.shape if 'input_ids' in locals() else 'unknown'}")
+            raise Exception(f"Generation error: {str(e)}")
+    
+    def _generate_llama_cpp(self, prompt: str, max_length: int, max_new_tokens: int, temperature: float,
+                            top_p: float, top_k: int, do_sample: bool) -> Dict[str, Any]:
+        """Generate a response with the llama.cpp backend."""
+        try:
+            start_time = time.time()
+            
+            if max_new_tokens is None:
+                max_new_tokens = max(1, max_length - self.model.count_tokens(prompt))
+            
+            response_text, input_tokens, output_tokens = self.model.generate(
+                prompt, max_new_tokens, temperature, top_p, top_k, do_sample
+            )
+            
+            return {
+                "response": response_text,
+                "model_name": self.model_name,
+                "generation_time": time.time() - start_time,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens
+            }
+            
+        except Exception as e:
+            logger.error(f"Error during generation: {str(e)}")
+            raise Exception(f"Generation error: {str(e)}")
+    
+    def stream_response(self, prompt: str, max_length: int = 512, max_new_tokens: int = None,
+                        temperature: float = 0.7, top_p: float = 0.9, top_k: int = 50,
+                        do_sample: bool = True, *, executor: Executor,
+                        stop_event: threading.Event) -> Tuple[Iterator[str], Future]:
+        """Start generating on executor; return the text chunk iterator and the generation future.
+        
+        Generation stops at the next token once stop_event is set. The future completes when the
+        model is done, so callers can hold an inference slot until then.
+        """
+        self._require_ready()
+        
+        if self.backend == "llama.cpp":
+            if max_new_tokens is None:
+                max_new_tokens = max(1, max_length - self.model.count_tokens(prompt))
+            chunks = queue.Queue()
+            
+            def run_llama_cpp():
+                try:
+                    for text in self.model.stream(prompt, max_new_tokens, temperature, top_p, top_k, do_sample):
+                        if stop_event.is_set():
+                            break
+                        chunks.put(text)
+                except Exception as e:
+                    logger.error(f"Error during streamed generation: {str(e)}")
+                    raise
+                finally:
+                    chunks.put(None)
+            
+            generation = executor.submit(run_llama_cpp)
+            return self._iter_stream(iter(chunks.get, None), generation), generation
+        
+        input_ids = torch.as_tensor(self._encode_cache(prompt, max_length)).unsqueeze(0)
+        if max_new_tokens is None:
+            max_new_tokens = max(1, max_length - input_ids.shape[1])
+        
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        generation_kwargs = {
+            "attention_mask": torch.ones_like(input_ids),
+            "generation_config": self._request_generation_config(
+                max_new_tokens=max_new_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                top_k=top_k,
+                do_sample=do_sample
+            ),
+            "streamer": streamer,
+            "stopping_criteria": StoppingCriteriaList([StopOnEvent(stop_event)]),
+        }
+        
+        def run_generation():
+            try:
+                with torch.inference_mode():
+                    self.model.generate(input_ids, **generation_kwargs)
+            except Exception as e:
+                logger.error(f"Error during streamed generation: {str(e)}")
+                streamer.end()
+                raise
+        
+        # generate() blocks until done, so it runs on the executor feeding the streamer
+        generation = executor.submit(run_generation)
+        return self._iter_stream(streamer, generation), generation
+    
+    @staticmethod
+    def _iter_stream(chunks: Iterator[str], generation: Future) -> Iterator[str]:
+        """Yield non-empty chunks, then surface any error the generation raised."""
+        for text in chunks:
+            if text:
+                yield text
+        
+        error = generation.exception()
+        if error is not None:
+            raise Exception(f"Generation error: {str(error)}")
+    
+    def _require_ready(self):
+        """Raise unless a fully loaded model is ready to generate."""
+        state = self.state
+        if state == "loading":
+            raise Exception("Model is currently loading. Please wait.")
+        if state != "ready":
+            raise Exception("No model is currently loaded. Please deploy a model first.")
+    
+    def _request_generation_config(self, **overrides) -> GenerationConfig:
+        """Copy the load-time generation defaults and apply one request's parameters."""
+        generation_config = copy.copy(self.generation_config)
+        generation_config.update(**overrides)
+        return generation_config
+    
+    def _raw_encode(self, prompt: str, max_length: int) -> Tuple[int, ...]:
+        """Tokenize a prompt with truncation, returning immutable token ids for caching."""
+        with self._tokenize_lock:
+            return tuple(self.tokenizer(prompt, truncation=True, max_length=max_length)["input_ids"])
+    
+    def _reset_encode_cache(self):
+        """Create a fresh prompt encoding cache bound to the current tokenizer."""
+        self._encode_cache = functools.lru_cache(maxsize=settings.TOKENIZER_CACHE)(self._raw_encode)
+    
+    def _encode_prompts(self, prompts: List[str], max_length: int) -> Dict[str, torch.Tensor]:
+        """Build left-padded input_ids and attention_mask tensors from cached encodings."""
+        encoded = [self._encode_cache(prompt, max_length) for prompt in prompts]
+        prompt_length = max(len(ids) for ids in encoded)
+        
+        input_ids = torch.full((len(encoded), prompt_length), self.tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(encoded), prompt_length), dtype=torch.long)
+        for i, ids in enumerate(encoded):
+            if ids:
+                input_ids[i, prompt_length - len(ids):] = torch.as_tensor(ids)
+                attention_mask[i, prompt_length - len(ids):] = 1
+        
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+    
+    def generate_batch(self, prompts: List[str], max_length: int = 512, max_new_tokens: int = None,
+                       temperature: float = 0.7, top_p: float = 0.9, top_k: int = 50,
+                       do_sample: bool = True, num_return_sequences: int = 1) -> List[Dict[str, Any]]:
+        """Generate responses for several prompts with a single batched generate call."""
+        self._require_ready()
+        
+        # A lone prompt goes through the single-sequence path, which can reuse cached prefixes;
+        # llama.cpp has no batched API, so its prompts always run one at a time
+        if (len(prompts) == 1 and num_return_sequences == 1 and self.use_prefix_cache) or self.backend == "llama.cpp":
+            return [self.generate_response(prompt, max_length, max_new_tokens, temperature,
+                                           top_p, top_k, do_sample, num_return_sequences)
+                    for prompt in prompts]
+        
+        try:
+            start_time = time.time()
+            
+            # Tokenize all prompts into one left-padded tensor
+            inputs = self._encode_prompts(prompts, max_length)
+            prompt_length = inputs["input_ids"].shape[1]
+            input_tokens = inputs["attention_mask"].sum(dim=1).tolist()
+            
+            # Each row keeps its own max_length budget; the batch runs for the largest one
+            if max_new_tokens is None:
+                budgets = [max(1, max_length - tokens) for tokens in input_tokens]
+            else:
+                budgets = [max_new_tokens] * len(prompts)
+            
+            generation_config = self._request_generation_config(
+                max_new_tokens=max(budgets),
+                temperature=temperature,
+                top_p=top_p,
+                top_k=top_k,
+                do_sample=do_sample,
+                num_return_sequences=num_return_sequences
+            )
+            
+            with torch.inference_mode():
+                outputs = self.model.generate(**inputs, generation_config=generation_config)
+            
+            generation_time = time.time() - start_time
+            
+            # Slice each prompt's first returned sequence out of the batch and decode them in one call
+            generated = []
+            for i, budget in enumerate(budgets):
+                generated_ids = outputs[i * num_return_sequences, prompt_length:prompt_length + budget]
+                generated.append(generated_ids[generated_ids != self.tokenizer.pad_token_id])
+            texts = self.tokenizer.batch_decode(generated, skip_special_tokens=True)
+            
+            return [
+                {
+                    "response": text.strip(),
+                    "model_name": self.model_name,
+                    "generation_time": generation_time,
+                    "input_tokens": tokens,
+                    "output_tokens": len(generated_ids)
+                }
+                for text, tokens, generated_ids in zip(texts, input_tokens, generated)
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error during batched generation: {str(e)}")
             raise Exception(f"Generation error: {str(e)}")
     
+    def _bump_version(self):
+        """Record a state transition and rebuild the cached status once."""
+        version = self.state_version + 1
+        self._cached_status = (self._build_status(), version)
+        self.state_version = version
+        
+        # Listeners may be called from the loader thread; they must hand off thread-safely
+        for listener in list(self._state_listeners):
+            try:
+                listener(*self._cached_status)
+            except Exception as e:
+                logger.warning(f"State listener failed: {e}")
+    
+    def add_state_listener(self, listener: Callable[[Dict[str, Any], int], None]):
+        """Register a callback invoked with (status, version) on every state transition."""
+        self._state_listeners.append(listener)
+    
+    def remove_state_listener(self, listener: Callable[[Dict[str, Any], int], None]):
+        """Unregister a state transition callback."""
+        if listener in self._state_listeners:
+            self._state_listeners.remove(listener)
+    
     def get_status(self) -> Dict[str, Any]:
-        """Get the current status of the model."""
+        """Get the current status of the model (rebuilt only on state transitions)."""
+        return self._cached_status[0]
+    
+    def get_status_with_version(self) -> Tuple[Dict[str, Any], int]:
+        """Get the cached status together with the state version it was built from."""
+        return self._cached_status
+    
+    def _build_status(self) -> Dict[str, Any]:
+        """Build the status dict from the current model state."""
         device = "unknown"
+        state = self.state
         
-        # Check if model is loaded
-        is_loaded = self.model is not None or self.generator is not None
-        
-        if self.model is not None:
+        if state == "ready":
             if hasattr(self.model, 'device'):
                 device = str(self.model.device)
             elif hasattr(self.model, 'hf_device_map'):
                 device = str(self.model.hf_device_map)
-        elif self.generator is not None:
-            # For pipeline, check if it has device info
-            if hasattr(self.generator, 'device'):
-                device = str(self.generator.device)
-            else:
-                device = "cpu"  # Default
         
         return {
             "model_name": self.model_name,
-            "is_loaded": is_loaded,
-            "is_loading": self.is_loading,
-            "device": device
+            "state": state,
+            "is_loaded": state == "ready",
+            "is_loading": state == "loading",
+            "device": device,
+            "load_progress": self.load_progress,
+            "load_error": self.load_error,
+            "slow_tokenizer": self.slow_tokenizer
         }
     
-    def set_model_name(self, model_name: str):
-        """Set the model name."""
+    def begin_loading(self, model_name: str):
+        """Mark a deploy as started before the load thread runs, so status reflects it immediately."""
         self.model_name = model_name
+        self.state = "loading"
+        self.load_progress = 0.0
+        self.load_error = None
+        self._bump_version()
@@ -2,8 +2,8 @@
 Pydantic models for the LLM Deployment Service
 """
 
-from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
 
 
 class ModelRequest(BaseModel):
@@ -12,8 +12,10 @@ class ModelRequest(BaseModel):
     
     model_name: str
     device: Optional[str] = "cpu"  # CPU-only for VM compatibility
-    load_in_8bit: Optional[bool] = False  # Disabled for CPU-only
-    load_in_4bit: Optional[bool] = False  # Disabled for CPU-only
+    load_in_8bit: Optional[bool] = False  # INT8 weight-only via ipex-llm on VNNI/AMX CPUs
+    load_in_4bit: Optional[bool] = False  # INT4 weight-only via ipex-llm on VNNI/AMX CPUs
+    load_in_8bit_cpu: Optional[bool] = False  # INT8 dynamic quantization of Linear layers via PyTorch
+    backend: Optional[str] = "pytorch"  # "pytorch", "onnx" (ONNX Runtime INT8) or "llama.cpp" (GGUF)
     trust_remote_code: Optional[bool] = True
     hf_token: Optional[str] = None
 
@@ -32,6 +34,20 @@ class QueryRequest(BaseModel):
     num_return_sequences: Optional[int] = 1
 
 
+class BatchQueryRequest(BaseModel):
+    """Request model for querying the deployed model with several prompts at once."""
+    model_config = ConfigDict(protected_namespaces=())
+    
+    prompts: List[str] = Field(min_length=1)
+    max_length: Optional[int] = 512
+    max_new_tokens: Optional[int] = None  # If provided, will override max_length calculation
+    temperature: Optional[float] = 0.7
+    top_p: Optional[float] = 0.9
+    top_k: Optional[int] = 50
+    do_sample: Optional[bool] = True
+    num_return_sequences: Optional[int] = 1
+
+
 class QueryResponse(BaseModel):
     """Response model for query results."""
     model_config = ConfigDict(protected_namespaces=())
@@ -43,11 +59,21 @@ class QueryResponse(BaseModel):
     output_tokens: int
 
 
+class BatchQueryResponse(BaseModel):
+    """Response model for batched query results, in prompt order."""
+    
+    responses: List[QueryResponse]
+
+
 class ModelStatus(BaseModel):
     """Response model for model status."""
     model_config = ConfigDict(protected_namespaces=())
     
     model_name: Optional[str]
+    state: Optional[str] = None  # "empty", "loading", "ready" or "unloading"
     is_loaded: bool
     is_loading: bool
     device: Optional[str]
+    load_progress: Optional[float] = None  # Fraction of model files downloaded, 0.0-1.0
+    load_error: Optional[str] = None  # Why the last deploy failed, if it did
+    slow_tokenizer: bool = False  # Loaded the Python tokenizer because the Rust one was unavailable
@@ -0,0 +1,119 @@
+"""
+Prefix KV cache for the LLM Deployment Service
+Keeps the attention key/value tensors of recent prompts so a later prompt that
+starts with one of them only has to prefill its new tokens
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from transformers import DynamicCache
+
+# A stored key or value tensor, shaped [batch, heads, tokens, head_dim], and its INT8 scale (None if unquantized)
+PackedTensor = Tuple[torch.Tensor, Optional[torch.Tensor]]
+# Key and value tensors of one decoder layer
+LayerKV = Tuple[PackedTensor, PackedTensor]
+
+
+def quantize_int8(tensor: torch.Tensor, dim: int) -> PackedTensor:
+    """Symmetric INT8 quantization with one scale per slice along dim."""
+    scale = tensor.abs().amax(dim=dim, keepdim=True).clamp(min=1e-8) / 127
+    return torch.round(tensor / scale).clamp(-127, 127).to(torch.int8), scale
+
+
+def unpack(packed: PackedTensor, length: int) -> torch.Tensor:
+    """Return the first length token positions of a stored tensor in its original dtype."""
+    data, scale = packed
+    if scale is None:
+        return data[..., :length, :]
+    # Per-channel scales have a single token position, per-token scales are sliced with the data
+    return data[..., :length, :].to(scale.dtype) * scale[..., :length, :]
+
+
+class PrefixKVCache:
+    """LRU cache of per-layer key/value tensors keyed by prompt token ids, bounded in bytes."""
+    
+    def __init__(self, max_bytes: int, kv_dtype: str = "float"):
+        self.max_bytes = max_bytes
+        # "int8" stores keys per-channel and values per-token quantized, about 4x smaller than float32
+        self.kv_dtype = kv_dtype
+        self.total_bytes = 0
+        self._entries: "OrderedDict[Tuple[int, ...], Tuple[List[LayerKV], int]]" = OrderedDict()
+        # Number of cached prefixes of each length, so lookups only probe lengths that exist
+        self._lengths: Dict[int, int] = {}
+        self._lock = threading.Lock()
+    
+    def lookup(self, token_ids: Tuple[int, ...], config=None) -> Tuple[int, Optional[DynamicCache]]:
+        """Return (cached_length, cache) for the longest cached prefix of token_ids."""
+        with self._lock:
+            for length in sorted(self._lengths, reverse=True):
+                if length > len(token_ids):
+                    continue
+                entry = self._entries.get(token_ids[:length])
+                if entry is not None:
+                    self._entries.move_to_end(token_ids[:length])
+                    layers = entry[0]
+                    break
+            else:
+                return 0, None
+        
+        # generate() needs at least one uncached token to produce the next logits
+        length = min(length, len(token_ids) - 1)
+        if length <= 0:
+            return 0, None
+        
+        # Rebuilding through update() copies the tensors, so generation never mutates the entry
+        cache = DynamicCache(config=config)
+        for layer_idx, (keys, values) in enumerate(layers):
+            cache.update(unpack(keys, length), unpack(values, length), layer_idx)
+        return length, cache
+    
+    def insert(self, token_ids: Tuple[int, ...], cache: DynamicCache):
+        """Store the first len(token_ids) positions of a generate() cache, evicting LRU entries."""
+        length = len(token_ids)
+        layers = []
+        for layer in cache.layers:
+            keys, values = getattr(layer, "keys", None), getattr(layer, "values", None)
+            # Sliding-window layers drop early positions, so they cannot seed a later prompt
+            if keys is None or keys.shape[-2] < length:
+                return
+            layers.append(self._pack(keys[..., :length, :], values[..., :length, :]))
+        
+        nbytes = sum(
+            data.nbytes + (scale.nbytes if scale is not None else 0)
+            for layer in layers for data, scale in layer
+        )
+        if nbytes > self.max_bytes:
+            return
+        
+        with self._lock:
+            if token_ids in self._entries:
+                self._entries.move_to_end(token_ids)
+                return
+            
+            self._entries[token_ids] = (layers, nbytes)
+            self._lengths[length] = self._lengths.get(length, 0) + 1
+            self.total_bytes += nbytes
+            
+            while self.total_bytes > self.max_bytes:
+                evicted_ids, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_bytes
+                self._lengths[len(evicted_ids)] -= 1
+                if not self._lengths[len(evicted_ids)]:
+                    del self._lengths[len(evicted_ids)]
+    
+    def _pack(self, keys: torch.Tensor, values: torch.Tensor) -> LayerKV:
+        """Copy one layer's prefix tensors into storage, quantizing them if configured."""
+        if self.kv_dtype == "int8":
+            # Keys have outlier channels and values outlier tokens, so scale along those axes
+            return quantize_int8(keys, dim=-2), quantize_int8(values, dim=-1)
+        return (keys.clone(), None), (values.clone(), None)
+    
+    def clear(self):
+        """Drop every cached prefix."""
+        with self._lock:
+            self._entries.clear()
+            self._lengths.clear()
+            self.total_bytes = 0
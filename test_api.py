@@ -6,48 +6,69 @@ This script tests all the API endpoints to ensure they work correctly.
 """
 
 import requests
-import json
+import orjson
+import logging
 import time
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# One keep-alive connection pool shared by every request in this script
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                                     max_retries=Retry(total=3, backoff_factor=0.1)))
+
+# (connect, read) timeouts so a hung server fails the call instead of blocking the run
+CONNECT_TIMEOUT, READ_TIMEOUT = 3.0, 30.0
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+# Generation can legitimately take minutes on CPU
+QUERY_TIMEOUT = (CONNECT_TIMEOUT, 300.0)
+
+# Bodies are encoded with orjson, so the content type is set by hand
+JSON_HEADERS = {"Content-Type": "application/json"}
 
 class APITester:
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(self, base_url: str = "http://localhost:8000", session: Optional[requests.Session] = None):
         self.base_url = base_url
-        self.session = requests.Session()
+        self.session = session or SESSION
     
     def test_root_endpoint(self) -> bool:
         """Test the root endpoint."""
         try:
-            response = self.session.get(f"{self.base_url}/")
+            response = self.session.get(f"{self.base_url}/", timeout=TIMEOUT)
             if response.status_code == 200:
-                data = response.json()
-                print("✅ Root endpoint test passed")
-                print(f"   Service: {data.get('service')}")
-                print(f"   Version: {data.get('version')}")
+                data = orjson.loads(response.content)
+                logger.info("✅ Root endpoint test passed\n"
+                            f"   Service: {data.get('service')}\n"
+                            f"   Version: {data.get('version')}")
                 return True
             else:
-                print(f"❌ Root endpoint test failed: {response.status_code}")
+                logger.error(f"❌ Root endpoint test failed: {response.status_code}")
                 return False
         except Exception as e:
-            print(f"❌ Root endpoint test failed: {e}")
+            logger.error(f"❌ Root endpoint test failed: {e}")
             return False
     
     def test_status_endpoint(self) -> bool:
         """Test the status endpoint."""
         try:
-            response = self.session.get(f"{self.base_url}/status")
+            response = self.session.get(f"{self.base_url}/status", timeout=TIMEOUT)
             if response.status_code == 200:
-                data = response.json()
-                print("✅ Status endpoint test passed")
-                print(f"   Model loaded: {data.get('is_loaded')}")
-                print(f"   Model loading: {data.get('is_loading')}")
+                data = orjson.loads(response.content)
+                logger.info("✅ Status endpoint test passed\n"
+                            f"   Model loaded: {data.get('is_loaded')}\n"
+                            f"   Model loading: {data.get('is_loading')}")
                 return True
             else:
-                print(f"❌ Status endpoint test failed: {response.status_code}")
+                logger.error(f"❌ Status endpoint test failed: {response.status_code}")
                 return False
         except Exception as e:
-            print(f"❌ Status endpoint test failed: {e}")
+            logger.error(f"❌ Status endpoint test failed: {e}")
             return False
     
     def test_deploy_endpoint(self, model_name: str = "microsoft/DialoGPT-medium") -> bool:
@@ -60,47 +81,59 @@ class APITester:
                 "trust_remote_code": True
             }
             
-            response = self.session.post(f"{self.base_url}/deploy", json=payload)
-            if response.status_code == 200:
-                data = response.json()
-                print("✅ Deploy endpoint test passed")
-                print(f"   Message: {data.get('message')}")
-                print(f"   Model: {data.get('model_name')}")
-                print(f"   Device: {data.get('device')}")
+            response = self.session.post(f"{self.base_url}/deploy", data=orjson.dumps(payload), headers=JSON_HEADERS, timeout=TIMEOUT)
+            if response.status_code == 202:
+                data = orjson.loads(response.content)
+                logger.info("✅ Deploy endpoint test passed\n"
+                            f"   Message: {data.get('message')}\n"
+                            f"   Model: {data.get('model_name')}\n"
+                            f"   Device: {data.get('device')}")
                 return True
             else:
-                print(f"❌ Deploy endpoint test failed: {response.status_code}")
-                print(f"   Response: {response.text}")
+                logger.error(f"❌ Deploy endpoint test failed: {response.status_code}\n"
+                             f"   Response: {response.text}")
                 return False
         except Exception as e:
-            print(f"❌ Deploy endpoint test failed: {e}")
+            logger.error(f"❌ Deploy endpoint test failed: {e}")
             return False
     
     def wait_for_model_ready(self, timeout: int = 300) -> bool:
-        """Wait for the model to be ready."""
+        """Wait for the model to be ready, polling quickly at first and backing off to every 5s."""
         start_time = time.time()
+        delay = 0.25
+        last_state = None
         while time.time() - start_time < timeout:
             try:
-                response = self.session.get(f"{self.base_url}/status")
+                response = self.session.get(f"{self.base_url}/status", timeout=2)
                 if response.status_code == 200:
-                    data = response.json()
+                    data = orjson.loads(response.content)
+                    # Start polling quickly again whenever a new load begins
+                    state = (data.get("model_name"), data["is_loading"])
+                    if state != last_state:
+                        delay = 0.25
+                        last_state = state
+                    
                     if data["is_loaded"] and not data["is_loading"]:
-                        print("✅ Model is ready!")
+                        logger.info("✅ Model is ready!")
                         return True
                     elif data["is_loading"]:
-                        print(f"⏳ Model is loading... ({data.get('model_name', 'Unknown')})")
-                        time.sleep(5)
+                        logger.info(f"⏳ Model is loading... ({data.get('model_name', 'Unknown')})")
+                        time.sleep(delay)
+                        delay = min(delay * 2, 5.0)
+                    elif data.get("load_error"):
+                        logger.error(f"❌ Model loading failed: {data['load_error']}")
+                        return False
                     else:
-                        print("❌ No model is loaded")
+                        logger.error("❌ No model is loaded")
                         return False
                 else:
-                    print(f"❌ Status check failed: {response.status_code}")
+                    logger.error(f"❌ Status check failed: {response.status_code}")
                     return False
             except Exception as e:
-                print(f"❌ Status check failed: {e}")
+                logger.error(f"❌ Status check failed: {e}")
                 return False
         
-        print("❌ Model loading timeout")
+        logger.error("❌ Model loading timeout")
         return False
     
     def test_query_endpoint(self) -> bool:
@@ -112,44 +145,47 @@ class APITester:
                 "temperature": 0.7
             }
             
-            response = self.session.post(f"{self.base_url}/query", json=payload)
+            response = self.session.post(f"{self.base_url}/query", data=orjson.dumps(payload), headers=JSON_HEADERS, timeout=QUERY_TIMEOUT)
             if response.status_code == 200:
-                data = response.json()
-                print("✅ Query endpoint test passed")
-                print(f"   Response: {data.get('response')}")
-                print(f"   Generation time: {data.get('generation_time'):.2f}s")
-                print(f"   Input tokens: {data.get('input_tokens')}")
-                print(f"   Output tokens: {data.get('output_tokens')}")
+                data = orjson.loads(response.content)
+                text, generation_time, input_tokens, output_tokens = (
+                    data.get(key) for key in ("response", "generation_time", "input_tokens", "output_tokens")
+                )
+                # A missing generation_time must not crash the :.2f format
+                logger.info("✅ Query endpoint test passed\n"
+                            f"   Response: {text}\n"
+                            f"   Generation time: {generation_time or 0:.2f}s\n"
+                            f"   Input tokens: {input_tokens}\n"
+                            f"   Output tokens: {output_tokens}")
                 return True
             else:
-                print(f"❌ Query endpoint test failed: {response.status_code}")
-                print(f"   Response: {response.text}")
+                logger.error(f"❌ Query endpoint test failed: {response.status_code}\n"
+                             f"   Response: {response.text}")
                 return False
         except Exception as e:
-            print(f"❌ Query endpoint test failed: {e}")
+            logger.error(f"❌ Query endpoint test failed: {e}")
             return False
     
     def test_undeploy_endpoint(self) -> bool:
         """Test the undeploy endpoint."""
         try:
-            response = self.session.delete(f"{self.base_url}/undeploy")
+            response = self.session.delete(f"{self.base_url}/undeploy", timeout=TIMEOUT)
             if response.status_code == 200:
-                data = response.json()
-                print("✅ Undeploy endpoint test passed")
-                print(f"   Message: {data.get('message')}")
+                data = orjson.loads(response.content)
+                logger.info("✅ Undeploy endpoint test passed\n"
+                            f"   Message: {data.get('message')}")
                 return True
             else:
-                print(f"❌ Undeploy endpoint test failed: {response.status_code}")
-                print(f"   Response: {response.text}")
+                logger.error(f"❌ Undeploy endpoint test failed: {response.status_code}\n"
+                             f"   Response: {response.text}")
                 return False
         except Exception as e:
-            print(f"❌ Undeploy endpoint test failed: {e}")
+            logger.error(f"❌ Undeploy endpoint test failed: {e}")
             return False
     
     def run_all_tests(self) -> bool:
         """Run all API tests."""
-        print("🚀 Starting API Tests")
-        print("=" * 50)
+        logger.info("🚀 Starting API Tests")
         
         tests = [
             ("Root Endpoint", self.test_root_endpoint),
@@ -162,42 +198,42 @@ class APITester:
         
         passed = 0
         total = len(tests)
+        # Per-test outcomes, written out as one report at the end
+        report = []
         
         for test_name, test_func in tests:
-            print(f"\n📋 Testing: {test_name}")
-            print("-" * 30)
+            logger.info(f"📋 Testing: {test_name}")
             
             if test_func():
                 passed += 1
+                report.append(f"✅ {test_name}")
             else:
-                print(f"❌ {test_name} failed")
+                report.append(f"❌ {test_name} failed")
         
-        print("\n" + "=" * 50)
-        print(f"📊 Test Results: {passed}/{total} tests passed")
+        report.insert(0, f"📊 Test Results: {passed}/{total} tests passed")
+        report.append("🎉 All tests passed!" if passed == total else "❌ Some tests failed!")
+        logger.info("\n".join(report))
         
-        if passed == total:
-            print("🎉 All tests passed!")
-            return True
-        else:
-            print("❌ Some tests failed!")
-            return False
+        return passed == total
 
 def main():
     """Main function to run the tests."""
+    setup_logging("INFO")
+    
     # Check if service is running
     try:
-        response = requests.get("http://localhost:8000/", timeout=5)
+        response = SESSION.get("http://localhost:8000/", timeout=5)
         if response.status_code != 200:
-            print("❌ Service is not running or not responding correctly")
-            print("Please start the service with: python main.py")
+            logger.error("❌ Service is not running or not responding correctly\n"
+                         "Please start the service with: python main.py")
             sys.exit(1)
     except requests.exceptions.RequestException:
-        print("❌ Cannot connect to the service")
-        print("Please start the service with: python main.py")
+        logger.error("❌ Cannot connect to the service\n"
+                     "Please start the service with: python main.py")
         sys.exit(1)
     
     # Run tests
-    tester = APITester()
+    tester = APITester(session=SESSION)
     success = tester.run_all_tests()
     
     if success:
@@ -3,42 +3,26 @@
 Basic setup test - tests imports without transformers
 """
 
+import importlib.metadata
+import importlib.util
 import sys
 import os
 
-def test_basic_imports():
-    """Test basic imports that should work."""
+BASIC_PACKAGES = ("fastapi", "uvicorn", "pydantic", "requests", "numpy")
+
+def test_basic_imports(verbose: bool = False):
+    """Check that the basic packages are installed without importing them."""
     print("🧪 Testing basic imports...")
     
-    try:
-        import fastapi
-        print(f"✅ FastAPI version: {fastapi.__version__}")
-    except Exception as e:
-        print(f"❌ FastAPI import failed: {e}")
-    
-    try:
-        import uvicorn
-        print(f"✅ Uvicorn imported successfully")
-    except Exception as e:
-        print(f"❌ Uvicorn import failed: {e}")
-    
-    try:
-        import pydantic
-        print(f"✅ Pydantic version: {pydantic.__version__}")
-    except Exception as e:
-        print(f"❌ Pydantic import failed: {e}")
-    
-    try:
-        import requests
-        print(f"✅ Requests imported successfully")
-    except Exception as e:
-        print(f"❌ Requests import failed: {e}")
-    
-    try:
-        import numpy
-        print(f"✅ NumPy version: {numpy.__version__}")
-    except Exception as e:
-        print(f"❌ NumPy import failed: {e}")
+    # find_spec only locates the package; none of its import chain runs
+    for name in BASIC_PACKAGES:
+        if importlib.util.find_spec(name) is None:
+            print(f"❌ {name} is not installed")
+        elif verbose:
+            # Read from the installed package metadata, still without importing it
+            print(f"✅ {name} version: {importlib.metadata.version(name)}")
+        else:
+            print(f"✅ {name} found")
 
 def test_pytorch_import():
     """Test PyTorch import specifically."""
@@ -69,13 +53,13 @@ def main():
     print("🚀 Basic Setup Test Suite")
     print("=" * 60)
     
-    test_basic_imports()
+    test_basic_imports(verbose="-v" in sys.argv or "--verbose" in sys.argv)
     test_pytorch_import()
     test_transformers_import()
     
     print("\n" + "=" * 60)
     print("🎯 Test Summary:")
-    print("• If PyTorch fails: Run 'python fix_pytorch_compatibility.py'")
+    print("• If PyTorch fails: Run 'pip install --upgrade --extra-index-url https://download.pytorch.org/whl/cpu -r requirements.txt'")
     print("• If Transformers fails: Check version compatibility")
     print("• If basic imports fail: Check your Python environment")
 
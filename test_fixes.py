@@ -3,13 +3,31 @@
 Test script to verify the fixes for truncation, max_new_tokens, and dtype issues
 """
 
+import asyncio
+import httpx
 import requests
-import json
+import orjson
 import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # API base URL
 BASE_URL = "http://localhost:8000"
 
+# One keep-alive connection pool shared by every request in this script
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                                     max_retries=Retry(total=3, backoff_factor=0.1)))
+
+# (connect, read) timeouts so a hung server fails the call instead of blocking the run
+CONNECT_TIMEOUT, READ_TIMEOUT = 3.0, 30.0
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+# Generation can legitimately take minutes on CPU
+QUERY_TIMEOUT = (CONNECT_TIMEOUT, 300.0)
+
+# Bodies are encoded with orjson, so the content type is set by hand
+JSON_HEADERS = {"Content-Type": "application/json"}
+
 def test_model_deployment():
     """Test model deployment with a small model."""
     print("Testing model deployment...")
@@ -25,33 +43,52 @@ def test_model_deployment():
     }
     
     try:
-        response = requests.post(f"{BASE_URL}/deploy", json=deploy_data)
+        response = SESSION.post(f"{BASE_URL}/deploy", data=orjson.dumps(deploy_data), headers=JSON_HEADERS, timeout=TIMEOUT)
         print(f"Deploy response: {response.status_code}")
-        print(f"Response: {response.json()}")
-        
-        # Wait for model to load
-        time.sleep(10)
+        print(f"Response: {orjson.loads(response.content)}")
         
-        return response.status_code == 200
+        return response.status_code == 202 and wait_for_model_loaded()
     except Exception as e:
         print(f"Deploy error: {e}")
         return False
 
+def wait_for_model_loaded(timeout: float = 300) -> bool:
+    """Poll /status with exponential backoff (0.25s doubling up to 5s) until loading finishes."""
+    deadline = time.time() + timeout
+    delay = 0.25
+    
+    try:
+        while time.time() < deadline:
+            status = orjson.loads(SESSION.get(f"{BASE_URL}/status", timeout=2).content)
+            if not status["is_loading"]:
+                if status.get("load_error"):
+                    print(f"Model loading failed: {status['load_error']}")
+                return status["is_loaded"]
+            
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+        
+        print("Timed out waiting for the model to load")
+        return False
+    except Exception as e:
+        print(f"Status error: {e}")
+        return False
+
 def test_model_status():
     """Test getting model status."""
     print("\nTesting model status...")
     
     try:
-        response = requests.get(f"{BASE_URL}/status")
+        response = SESSION.get(f"{BASE_URL}/status", timeout=TIMEOUT)
         print(f"Status response: {response.status_code}")
-        print(f"Status: {response.json()}")
+        print(f"Status: {orjson.loads(response.content)}")
         return response.status_code == 200
     except Exception as e:
         print(f"Status error: {e}")
         return False
 
-def test_generation():
-    """Test text generation with the fixes."""
+async def test_generation():
+    """Test text generation with the fixes; both queries are sent concurrently."""
     print("\nTesting text generation...")
     
     # Test with max_length only
@@ -77,21 +114,26 @@ def test_generation():
     }
     
     try:
+        # The two queries are independent, so their generation times overlap on the server
+        async with httpx.AsyncClient(base_url=BASE_URL, timeout=httpx.Timeout(QUERY_TIMEOUT[1], connect=CONNECT_TIMEOUT)) as client:
+            response1, response2 = await asyncio.gather(
+                client.post("/query", content=orjson.dumps(query_data_1), headers=JSON_HEADERS),
+                client.post("/query", content=orjson.dumps(query_data_2), headers=JSON_HEADERS)
+            )
+        
         print("Testing with max_length...")
-        response1 = requests.post(f"{BASE_URL}/query", json=query_data_1)
         print(f"Query 1 response: {response1.status_code}")
         if response1.status_code == 200:
-            result1 = response1.json()
+            result1 = orjson.loads(response1.content)
             print(f"Generated text: {result1['response']}")
             print(f"Generation time: {result1['generation_time']:.2f}s")
         else:
             print(f"Error: {response1.text}")
         
         print("\nTesting with max_new_tokens...")
-        response2 = requests.post(f"{BASE_URL}/query", json=query_data_2)
         print(f"Query 2 response: {response2.status_code}")
         if response2.status_code == 200:
-            result2 = response2.json()
+            result2 = orjson.loads(response2.content)
             print(f"Generated text: {result2['response']}")
             print(f"Generation time: {result2['generation_time']:.2f}s")
         else:
@@ -107,9 +149,9 @@ def test_model_undeploy():
     print("\nTesting model undeployment...")
     
     try:
-        response = requests.delete(f"{BASE_URL}/undeploy")
+        response = SESSION.delete(f"{BASE_URL}/undeploy", timeout=TIMEOUT)
         print(f"Undeploy response: {response.status_code}")
-        print(f"Response: {response.json()}")
+        print(f"Response: {orjson.loads(response.content)}")
         return response.status_code == 200
     except Exception as e:
         print(f"Undeploy error: {e}")
@@ -128,7 +170,7 @@ def main():
         status_success = test_model_status()
         
         # Test generation
-        generation_success = test_generation()
+        generation_success = asyncio.run(test_generation())
         
         # Test undeployment
         undeploy_success = test_model_undeploy()
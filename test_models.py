@@ -5,17 +5,33 @@ Test script to verify model compatibility
 
 import sys
 import os
+import logging
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from model_manager import ModelManager
-from utils import is_large_model, format_error_message
+from config import settings
+from model_manager import ModelManager, configure_cpu_threads
+from utils import is_large_model, format_error_message, setup_logging, check_system_resources
 
-def test_model_compatibility(model_name: str):
-    """Test if a model can be loaded successfully."""
-    print(f"🧪 Testing model: {model_name}")
-    print("=" * 60)
-    
-    manager = ModelManager()
+logger = logging.getLogger(__name__)
+
+TEST_PROMPTS = [
+    "Hello, how are you?",
+    "The weather today is",
+    "Once upon a time",
+]
+
+# Models are tested two at a time in worker processes only with at least this much free RAM
+PARALLEL_MIN_RAM_GB = 8
+
+# Manager owned by a worker process, created once by _init_worker
+_worker_manager = None
+
+def test_model_compatibility(model_name: str, manager: ModelManager):
+    """Test if a model can be loaded successfully with the shared manager."""
+    logger.info(f"🧪 Testing model: {model_name}")
     
     try:
         # Try to load the model
@@ -27,35 +43,56 @@ def test_model_compatibility(model_name: str):
             trust_remote_code=True
         )
         
-        print(f"✅ SUCCESS: {model_name} loaded successfully!")
+        logger.info(f"✅ SUCCESS: {model_name} loaded successfully!")
         
-        # Test a simple generation
+        # Test generation for a few prompts at once; loads stay sequential to bound memory
         try:
-            result = manager.generate_response(
-                prompt="Hello, how are you?",
-                max_length=50,
-                temperature=0.7
-            )
-            print(f"✅ Generation test passed!")
-            print(f"Response: {result['response'][:100]}...")
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=min(len(TEST_PROMPTS), os.cpu_count() or 1)) as executor:
+                results = list(executor.map(
+                    lambda prompt: manager.generate_response(prompt=prompt, max_length=50, temperature=0.7),
+                    TEST_PROMPTS
+                ))
+            logger.info(f"✅ Generation test passed! ({time.perf_counter() - start_time:.2f}s for {len(results)} prompts)")
+            for result in results:
+                logger.info(f"Response: {result['response'][:100]}...")
         except Exception as e:
-            print(f"⚠️  Generation failed: {e}")
-        
-        # Clean up
-        manager.unload_model()
-        print(f"✅ Model unloaded successfully")
+            logger.warning(f"⚠️  Generation failed: {e}")
         
     except Exception as e:
-        print(f"❌ FAILED: {e}")
+        logger.error(f"❌ FAILED: {e}")
         formatted_error = format_error_message(str(e))
-        print(f"💡 Suggestions: {formatted_error}")
-    
-    print("\n" + "=" * 60 + "\n")
+        logger.info(f"💡 Suggestions: {formatted_error}")
+
+def run_model_test(model_name: str, manager: ModelManager):
+    """Test one model and unload it again so the manager is free for the next one."""
+    try:
+        test_model_compatibility(model_name, manager)
+    finally:
+        if manager.state == "ready":
+            manager.unload_model()
+            logger.info("✅ Model unloaded successfully")
+
+def configure_prompt_threads(cores: int):
+    """Split cores between the test prompts, which generate concurrently."""
+    configure_cpu_threads(max(1, cores // len(TEST_PROMPTS)))
+
+def _init_worker():
+    """Set up logging, threads and the per-process ModelManager in a pool worker."""
+    global _worker_manager
+    setup_logging("INFO")
+    # TORCH_NUM_THREADS defaults to half the cores, one share for each of the two workers
+    configure_prompt_threads(settings.TORCH_NUM_THREADS)
+    _worker_manager = ModelManager()
+
+def _run_model_test_in_worker(model_name: str):
+    """Test one model with the worker process's own manager."""
+    run_model_test(model_name, _worker_manager)
 
 def main():
     """Test multiple models for compatibility."""
-    print("🚀 Model Compatibility Test Suite")
-    print("=" * 60)
+    setup_logging("INFO")
+    logger.info("🚀 Model Compatibility Test Suite")
     
     # Test models in order of reliability
     test_models = [
@@ -66,13 +103,25 @@ def main():
         "facebook/opt-125m",  # Another option
     ]
     
-    for model in test_models:
-        test_model_compatibility(model)
+    resources = check_system_resources()
+    if resources and resources["memory"]["available_gb"] >= PARALLEL_MIN_RAM_GB:
+        # Two isolated processes overlap downloads and loading, each with its own thread share.
+        # spawn rather than fork, since forking after torch has started its thread pools can hang
+        with ProcessPoolExecutor(max_workers=min(2, len(test_models)),
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker) as executor:
+            list(executor.map(_run_model_test_in_worker, test_models))
+    else:
+        # One manager for every model; each test unloads before the next load
+        configure_prompt_threads(os.cpu_count() or 1)
+        manager = ModelManager()
+        for model in test_models:
+            run_model_test(model, manager)
     
-    print("🎯 Summary:")
-    print("• gpt2 and distilgpt2 are the most reliable")
-    print("• microsoft/DialoGPT-medium is good for testing")
-    print("• Try the recommended models first!")
+    logger.info("🎯 Summary:\n"
+                "• gpt2 and distilgpt2 are the most reliable\n"
+                "• microsoft/DialoGPT-medium is good for testing\n"
+                "• Try the recommended models first!")
 
 if __name__ == "__main__":
     main()
@@ -13,22 +13,24 @@ import logging
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from model_manager import ModelManager
-from utils import setup_logging, check_system_resources
+from utils import setup_logging, get_system_status_and_recommendations
+
+logger = logging.getLogger(__name__)
 
 def test_model_deployment():
     """Test model deployment with different models."""
-    print("🚀 Testing Unified Model Deployment")
-    print("=" * 50)
-    
     # Setup logging
     setup_logging("INFO")
     
+    logger.info("🚀 Testing Unified Model Deployment")
+    
     # Check system resources
-    resources = check_system_resources()
-    print(f"📊 System Resources:")
-    print(f"   Memory: {resources['memory']['available_gb']:.1f}GB available")
-    print(f"   CPU: {resources['cpu']['cores']} cores")
-    print(f"   Disk: {resources['disk']['free_gb']:.1f}GB free")
+    resources, recommendations = get_system_status_and_recommendations()
+    logger.info(f"📊 System Resources:\n"
+                f"   Memory: {resources['memory']['available_gb']:.1f}GB available\n"
+                f"   CPU: {resources['cpu']['cores']} cores\n"
+                f"   Disk: {resources['disk']['free_gb']:.1f}GB free\n"
+                f"   Recommended models: {', '.join(recommendations)}")
     
     # Test models (from small to large)
     test_models = [
@@ -40,13 +42,12 @@ def test_model_deployment():
     model_manager = ModelManager()
     
     for i, model_name in enumerate(test_models, 1):
-        print(f"\n🧪 Test {i}: Deploying {model_name}")
-        print("-" * 40)
+        logger.info(f"🧪 Test {i}: Deploying {model_name}")
         
         try:
             # Deploy model
-            print(f"📥 Loading {model_name}...")
-            start_time = time.time()
+            logger.info(f"📥 Loading {model_name}...")
+            start_time = time.perf_counter()
             
             model_manager.load_model_sync(
                 model_name=model_name,
@@ -57,8 +58,8 @@ def test_model_deployment():
                 hf_token=None
             )
             
-            load_time = time.time() - start_time
-            print(f"✅ Model loaded in {load_time:.2f} seconds")
+            load_time = time.perf_counter() - start_time
+            logger.info(f"✅ Model loaded in {load_time:.2f} seconds")
             
             # Test inference
             test_prompts = [
@@ -67,59 +68,54 @@ def test_model_deployment():
                 "Write a short poem about technology:"
             ]
             
-            for j, prompt in enumerate(test_prompts, 1):
-                print(f"\n  🤖 Test {i}.{j}: {prompt[:30]}...")
-                
-                try:
-                    result = model_manager.generate_response(
-                        prompt=prompt,
-                        max_length=100,
-                        temperature=0.7
-                    )
-                    
-                    print(f"    ✅ Response: {result['response'][:100]}...")
-                    print(f"    ⏱️  Time: {result['generation_time']:.2f}s")
-                    print(f"    📝 Tokens: {result['input_tokens']} → {result['output_tokens']}")
-                    
-                except Exception as e:
-                    print(f"    ❌ Inference failed: {e}")
+            # Generate all prompts with one padded, batched generate call
+            try:
+                results = model_manager.generate_batch(test_prompts, max_length=100, temperature=0.7)
+            except Exception as e:
+                logger.error(f"❌ Inference failed: {e}")
+                results = []
+            
+            for j, (prompt, result) in enumerate(zip(test_prompts, results), 1):
+                logger.info(f"🤖 Test {i}.{j}: {prompt[:30]}...\n"
+                            f"    ✅ Response: {result['response'][:100]}...\n"
+                            f"    ⏱️  Time: {result['generation_time']:.2f}s\n"
+                            f"    📝 Tokens: {result['input_tokens']} → {result['output_tokens']}")
             
             # Clean up
-            print(f"\n  🧹 Unloading {model_name}...")
+            logger.info(f"🧹 Unloading {model_name}...")
             model_manager.unload_model()
-            print(f"  ✅ Model unloaded successfully")
+            logger.info(f"✅ Model unloaded successfully")
             
         except Exception as e:
-            print(f"❌ Failed to deploy {model_name}: {e}")
+            logger.error(f"❌ Failed to deploy {model_name}: {e}")
             # Try to clean up if model was partially loaded
             try:
                 model_manager.unload_model()
             except:
                 pass
     
-    print("\n🎉 Unified model deployment test completed!")
+    logger.info("🎉 Unified model deployment test completed!")
 
 def test_api_integration():
     """Test API integration."""
-    print("\n\n🔌 Testing API Integration")
-    print("=" * 50)
+    logger.info("🔌 Testing API Integration")
     
     try:
         from api_routes import router
-        print("✅ API router imported successfully")
+        logger.info("✅ API router imported successfully")
         
         from models import ModelRequest, QueryRequest
-        print("✅ Model schemas imported successfully")
+        logger.info("✅ Model schemas imported successfully")
         
-        print("✅ API integration test passed!")
+        logger.info("✅ API integration test passed!")
         
     except Exception as e:
-        print(f"❌ API integration test failed: {e}")
+        logger.error(f"❌ API integration test failed: {e}")
 
 def main():
     """Main test function."""
-    print("🧪 Unified Model Deployment Test")
-    print("=" * 60)
+    setup_logging("INFO")
+    logger.info("🧪 Unified Model Deployment Test")
     
     # Test 1: Model deployment and inference
     test_model_deployment()
@@ -127,11 +123,10 @@ def main():
     # Test 2: API integration
     test_api_integration()
     
-    print("\n" + "=" * 60)
-    print("📊 Test Summary:")
-    print("✅ Unified model deployment flow working")
-    print("✅ API integration working")
-    print("\n💡 You can now deploy any Hugging Face model using the unified API!")
+    logger.info("📊 Test Summary:\n"
+                "✅ Unified model deployment flow working\n"
+                "✅ API integration working\n"
+                "\n💡 You can now deploy any Hugging Face model using the unified API!")
 
 if __name__ == "__main__":
     main()
@@ -2,11 +2,35 @@
 Utility functions for the LLM Deployment Service
 """
 
+import functools
 import logging
 import psutil
 import os
+import re
+import shutil
 import sys
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, FrozenSet, Optional, Tuple
+
+# Results of check_system_resources are reused for this many seconds
+RESOURCE_CACHE_TTL = 2.0
+_resource_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+
+# Model name size markers, compiled once so each check is a single scan in C
+_LARGE_MODEL_RE = re.compile(r"20b|70b|175b|13b|7b", re.IGNORECASE)
+
+# Every size marker in one alternation, so a name is classified in a single left-to-right pass.
+# Markers all end in "b", so a match never hides the start of another marker
+_SIZE_MARKER_RE = re.compile(r"175b|20b|70b|13b|7b|1b|2b|3b", re.IGNORECASE)
+_SIZE_CATEGORIES = ("small", "medium", "large", "xlarge")
+_MARKER_RANK = {"175b": 3, "20b": 3, "70b": 3, "13b": 3, "7b": 3, "1b": 1, "2b": 1, "3b": 1}
+
+# Error classes that get troubleshooting suggestions appended
+_COMPAT_ERROR_RE = re.compile(r"ModelWrapper|(?i:tokenizer)")
+_MEMORY_ERROR_RE = re.compile(r"out of memory|oom", re.IGNORECASE)
+
+# Prime the CPU usage counter so later non-blocking calls measure usage since this point
+psutil.cpu_percent(interval=None)
 
 
 def setup_logging(level: str = "INFO") -> None:
@@ -17,8 +41,23 @@ def setup_logging(level: str = "INFO") -> None:
     )
 
 
+def configure_openmp_env(num_threads: int, pin_threads: bool = False) -> None:
+    """Default the OpenMP/MKL thread pools; only effective before torch is first imported."""
+    os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+    os.environ.setdefault("MKL_NUM_THREADS", str(num_threads))
+    # Compact pinning puts every OpenMP team on the same cores, so it only suits a single
+    # inference worker; concurrent workers must be free to spread across the CPU
+    if pin_threads:
+        os.environ.setdefault("KMP_AFFINITY", "granularity=fine,compact,1,0")
+
+
 def check_system_resources() -> Dict[str, Any]:
-    """Check system resources and return status."""
+    """Check system resources and return status, cached for RESOURCE_CACHE_TTL seconds."""
+    global _resource_cache
+    now = time.monotonic()
+    if _resource_cache is not None and now - _resource_cache[0] < RESOURCE_CACHE_TTL:
+        return _resource_cache[1]
+    
     try:
         # Memory check
         memory = psutil.virtual_memory()
@@ -28,14 +67,16 @@ def check_system_resources() -> Dict[str, Any]:
         
         # CPU check
         cpu_count = psutil.cpu_count()
-        cpu_percent = psutil.cpu_percent(interval=1)
+        # Non-blocking: usage since the previous call instead of sampling for a full second
+        cpu_percent = psutil.cpu_percent(interval=None)
         
-        # Disk check
-        disk = psutil.disk_usage('/')
+        # Disk check on the Hugging Face cache, where model downloads land
+        hf_cache = os.environ.get("HF_HOME") or os.path.expanduser("~/.cache/huggingface")
+        disk = shutil.disk_usage(hf_cache if os.path.exists(hf_cache) else os.getcwd())
         disk_total_gb = disk.total / (1024**3)
         disk_free_gb = disk.free / (1024**3)
         
-        return {
+        resources = {
             "memory": {
                 "total_gb": total_gb,
                 "available_gb": available_gb,
@@ -51,11 +92,44 @@ def check_system_resources() -> Dict[str, Any]:
                 "free_gb": disk_free_gb
             }
         }
+        _resource_cache = (now, resources)
+        return resources
     except Exception as e:
         logging.error(f"Error checking system resources: {e}")
         return {}
 
 
+@functools.lru_cache(maxsize=None)
+def get_cpu_flags() -> FrozenSet[str]:
+    """Return the instruction set flags reported for the host CPU (probed once per process)."""
+    try:
+        import cpuinfo
+        return frozenset(cpuinfo.get_cpu_info().get("flags", []))
+    except ImportError:
+        pass
+    
+    # Fall back to /proc/cpuinfo on Linux when py-cpuinfo is not installed
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return frozenset(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    
+    return frozenset()
+
+
+def supports_int8_vnni() -> bool:
+    """Check whether the CPU has VNNI/AMX int8 instructions for low-bit inference."""
+    return bool(get_cpu_flags() & {"avx512_vnni", "avx_vnni", "amx_int8"})
+
+
+def supports_native_bf16() -> bool:
+    """Check whether the CPU computes bfloat16 natively (AMX or AVX512-BF16) instead of emulating it."""
+    return bool(get_cpu_flags() & {"amx_bf16", "avx512_bf16"})
+
+
 def get_model_recommendations(available_ram_gb: float) -> List[str]:
     """Get model recommendations based on available RAM."""
     if available_ram_gb < 8:
@@ -68,9 +142,18 @@ def get_model_recommendations(available_ram_gb: float) -> List[str]:
         return ["facebook/opt-1.3b", "microsoft/DialoGPT-large", "other large models"]
 
 
+def get_system_status_and_recommendations() -> Tuple[Dict[str, Any], List[str]]:
+    """Return system resources and model recommendations from a single memory reading."""
+    resources = check_system_resources()
+    if not resources:
+        return {}, []
+    return resources, get_model_recommendations(resources["memory"]["available_gb"])
+
+
+@functools.lru_cache(maxsize=64)
 def format_error_message(error: str) -> str:
     """Format error messages with helpful suggestions."""
-    if "ModelWrapper" in error or "tokenizer" in error.lower():
+    if _COMPAT_ERROR_RE.search(error):
         error += "\n\n💡 Model Compatibility Issue:\n"
         error += "This model may have compatibility issues with the current transformers version.\n"
         error += "\n💡 Try these alternative models instead:\n"
@@ -83,7 +166,7 @@ def format_error_message(error: str) -> str:
         error += "\n💡 General fixes:\n"
         error += "• Try updating transformers: pip install --upgrade transformers\n"
         error += "• Or use a different model for now\n"
-    elif "out of memory" in error.lower() or "oom" in error.lower():
+    elif _MEMORY_ERROR_RE.search(error):
         error += "\n\n💡 Memory optimization suggestions:\n"
         error += "• Try a smaller model (gpt2, distilgpt2)\n"
         error += "• Ensure you have sufficient RAM for the model\n"
@@ -93,10 +176,10 @@ def format_error_message(error: str) -> str:
     return error
 
 
+@functools.lru_cache(maxsize=256)
 def is_large_model(model_name: str) -> bool:
     """Check if a model is considered large."""
-    large_indicators = ["20b", "70b", "175b", "13b", "7b"]
-    return any(indicator in model_name.lower() for indicator in large_indicators)
+    return _LARGE_MODEL_RE.search(model_name) is not None
 
 
 def validate_model_name(model_name: str) -> bool:
@@ -113,11 +196,5 @@ def validate_model_name(model_name: str) -> bool:
 
 def get_model_size_category(model_name: str) -> str:
     """Get the size category of a model."""
-    if is_large_model(model_name):
-        return "xlarge"
-    elif any(size in model_name.lower() for size in ["7b", "13b"]):
-        return "large"
-    elif any(size in model_name.lower() for size in ["1b", "2b", "3b"]):
-        return "medium"
-    else:
-        return "small"
+    rank = max((_MARKER_RANK[marker.lower()] for marker in _SIZE_MARKER_RE.findall(model_name)), default=0)
+    return _SIZE_CATEGORIES[rank]